@@ -0,0 +1,63 @@
+# Per-request cost of the token revocation check. Times the denylist lookup
+# as the number of revoked tokens grows, then the whole get_current_user
+# dependency on a warm user cache with and without the check. Token
+# signatures are verified on every call unless TRUST_VERIFIED_TOKENS is set,
+# so both columns are shown for that path too.
+#
+#   python -m bench.bench_auth
+import os
+import tempfile
+import time
+import uuid
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+
+from core import auth, revocation  # noqa: E402
+from core.revocation import MemoryRevocationStore  # noqa: E402
+from core.security import create_access_token  # noqa: E402
+
+
+class _NoRevocation(MemoryRevocationStore):
+    def is_revoked(self, key):
+        return False
+
+
+def _per_call(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def _denylist(size: int) -> MemoryRevocationStore:
+    store = MemoryRevocationStore()
+    expires_at = time.time() + 3600
+    store.denied = {uuid.uuid4().hex: expires_at for _ in range(size)}
+    return store
+
+
+def run(sizes=(0, 10_000, 1_000_000), repeat: int = 200_000):
+    payload = {"sub": "bench", "jti": uuid.uuid4().hex, "fam": uuid.uuid4().hex}
+    print(f"{'revoked tokens':>15}{'check (us)':>12}")
+    for size in sizes:
+        revocation.revocation_store = _denylist(size)
+        check = _per_call(lambda: revocation.is_token_revoked(payload), repeat)
+        print(f"{size:>15,}{check * 1e6:>12.3f}")
+
+    token = create_access_token({"sub": "bench"})
+    auth.user_cache.set("bench", auth.UserSnapshot(id=1, username="bench", email="bench@example.com", role="user"))
+    print(f"\n{'token cache':>15}{'no check (us)':>15}{'with check (us)':>17}{'overhead (us)':>15}")
+    for trusted in (False, True):
+        auth.token_cache.maxsize = auth.settings.TOKEN_CACHE_MAX_SIZE if trusted else 0
+        auth.token_cache.clear()
+        calls = repeat // 10 if not trusted else repeat
+        timings = []
+        for store in (_NoRevocation(), _denylist(1_000_000)):
+            revocation.revocation_store = store
+            timings.append(_per_call(lambda: auth.get_current_user(token=token, db=None), calls))
+        print(f"{'on' if trusted else 'off':>15}{timings[0] * 1e6:>15.2f}{timings[1] * 1e6:>17.2f}"
+              f"{(timings[1] - timings[0]) * 1e6:>15.2f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,87 @@
+# Conflict detection over one large calendar: seeds a throwaway SQLite
+# database with N events for a single user and times the full
+# GET /api/events/conflicts pipeline (indexed fetch, sweep, encoding)
+# next to the sweep alone and, for small N, the pairwise comparison it
+# replaces.
+#
+#   python -m bench.bench_conflicts
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+
+from sqlalchemy import insert  # noqa: E402
+from db.session import Base, SessionLocal, engine  # noqa: E402
+import main  # noqa: E402,F401  (registers every model)
+from models.event import Event  # noqa: E402
+from models.user import User  # noqa: E402
+from routers.event import _conflict_lines  # noqa: E402
+from utils.intervals import overlapping_pairs, span_bucket  # noqa: E402
+
+WINDOW_START = datetime(2024, 1, 1)
+# Endpoint runs per size; the best one is reported
+REPEAT = 3
+
+
+def _intervals(count: int, rng: random.Random) -> list[tuple[datetime, datetime]]:
+    # About one event every 90 minutes over the window, 15 minutes to 2 hours
+    # long, so roughly a quarter of them overlap a neighbour.
+    starts = sorted(
+        WINDOW_START + timedelta(minutes=rng.randrange(count * 90)) for _ in range(count))
+    return [(s, s + timedelta(minutes=rng.choice((15, 30, 60, 120)))) for s in starts]
+
+
+def _pairwise(intervals):
+    return sum(
+        1 for i, (s1, e1) in enumerate(intervals) for s2, e2 in intervals[i + 1:]
+        if s1 < e2 and s2 < e1
+    )
+
+
+def _seed(intervals):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add(User(id=1, username="bench", email="bench@example.com", hashed_password="x"))
+        db.flush()
+        db.execute(insert(Event), [
+            {"title": f"event {i}", "description": "", "timestamp": s, "end_time": e,
+             "created_by": 1, "span_bucket": span_bucket(s, e)}
+            for i, (s, e) in enumerate(intervals)
+        ])
+        db.commit()
+
+
+def run(counts=(1_000, 10_000, 100_000)):
+    rng = random.Random(0)
+    print(f"{'events':>8}{'pairs':>8}{'sweep (ms)':>12}{'endpoint (ms)':>15}{'pairwise (ms)':>15}")
+    for count in counts:
+        intervals = _intervals(count, rng)
+        window_end = WINDOW_START + timedelta(minutes=count * 90 + 120)
+
+        started = time.perf_counter()
+        pairs = sum(1 for _ in overlapping_pairs((s, e, None) for s, e in intervals))
+        sweep = time.perf_counter() - started
+
+        _seed(intervals)
+        timings = []
+        for _ in range(REPEAT):
+            started = time.perf_counter()
+            body = b"".join(_conflict_lines([1], WINDOW_START, window_end))
+            timings.append(time.perf_counter() - started)
+            assert body.count(b"\n") == pairs
+        endpoint = min(timings)
+
+        pairwise = "-"
+        if count <= 10_000:
+            started = time.perf_counter()
+            assert _pairwise(intervals) == pairs
+            pairwise = f"{(time.perf_counter() - started) * 1e3:,.0f}"
+        print(f"{count:>8,}{pairs:>8,}{sweep * 1e3:>12,.1f}{endpoint * 1e3:>15,.0f}{pairwise:>15}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,42 @@
+# Expansion cost of a one-week window as the number of occurrences before
+# the window grows. The lazy expander should stay flat; enumerating the
+# series from its first occurrence (what a materializing expander does)
+# grows linearly.
+#
+#   python -m bench.bench_recurrence
+import time
+from datetime import datetime, timedelta
+from utils.recurrence import expand, iter_starts
+
+WINDOW_START = datetime(9000, 1, 1)  # far out, so long series still fit in datetime
+WINDOW_END = WINDOW_START + timedelta(days=7)
+RULES = {
+    "daily": {"freq": "daily"},
+    "weekly_mwf": {"freq": "weekly", "by_weekday": [0, 2, 4]},
+    "monthly": {"freq": "monthly"},
+}
+
+
+def _timed(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def run(lengths=(10, 1_000, 10_000, 100_000), repeat: int = 200):
+    print(f"{'rule':<12}{'before window':>15}{'lazy (us)':>12}{'full scan (us)':>16}")
+    for name, rule in RULES.items():
+        for length in lengths:
+            step = {"daily": 1, "weekly_mwf": 7 / 3, "monthly": 30.5}[name]
+            dtstart = WINDOW_START - timedelta(days=int(length * step))
+
+            lazy = _timed(lambda: list(expand(dtstart, rule, WINDOW_START, WINDOW_END)), repeat)
+            full = _timed(lambda: [
+                s for s in iter_starts(dtstart, rule, dtstart, WINDOW_END) if s >= WINDOW_START
+            ], max(1, repeat // 100))
+            print(f"{name:<12}{length:>15,}{lazy * 1e6:>12,.1f}{full * 1e6:>16,.0f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,92 @@
+# Search latency against table size: seeds a throwaway SQLite database with
+# N events spread over many users, 50 of them for the searching user
+# containing a rare word, and times the GET /api/events/search query for
+# that word and for a common one found in most events of every user, next
+# to a LIKE scan over the caller's events. Only the caller's events are
+# ranked, but the full-text index still lists every user's matches, so the
+# common word's time grows with N (about 60% of all events contain it).
+#
+#   python -m bench.bench_search
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+
+from sqlalchemy import insert, or_, select  # noqa: E402
+from db.session import Base, SessionLocal, engine  # noqa: E402
+import main  # noqa: E402,F401  (registers every model)
+from models.event import Event  # noqa: E402
+from models.user import User  # noqa: E402
+from routers.event import search_events  # noqa: E402
+
+START = datetime(2024, 1, 1)
+USERS = 100
+MATCHES = 50
+# RARE is only in the caller's MATCHES events, COMMON in most events
+RARE = "budget"
+COMMON = "standup"
+WORDS = ("standup", "review", "planning", "lunch", "dentist", "retro", "offsite", "sync", "demo", "call")
+
+
+def _seed(count: int, rng: random.Random):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.execute(insert(User), [
+            {"id": i, "username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": "x"}
+            for i in range(1, USERS + 1)
+        ])
+        db.execute(insert(Event), [
+            {"title": f"{rng.choice(WORDS)} {i}", "description": " ".join(rng.choices(WORDS, k=8)),
+             "timestamp": START + timedelta(minutes=i), "created_by": i % USERS + 1}
+            for i in range(count)
+        ])
+        db.execute(insert(Event), [
+            {"title": f"{RARE} {i}", "description": "quarterly numbers",
+             "timestamp": START + timedelta(hours=i), "created_by": 1}
+            for i in range(MATCHES)
+        ])
+        db.commit()
+
+
+def _best(fn, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        with SessionLocal() as db:
+            started = time.perf_counter()
+            fn(db)
+            timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def _like(db):
+    pattern = f"%{RARE}%"
+    return db.execute(select(Event.id).where(
+        Event.created_by == 1, or_(Event.title.like(pattern), Event.description.like(pattern))
+    )).all()
+
+
+def _search(q: str, user: User):
+    return lambda db: search_events(q=q, offset=0, limit=MATCHES, db=db, current_user=user)
+
+
+def run(counts=(10_000, 100_000, 1_000_000)):
+    rng = random.Random(0)
+    user = User(id=1)
+    print(f"{'events':>10}{f'{RARE!r} (ms)':>16}{f'{COMMON!r} (ms)':>18}{'LIKE scan (ms)':>16}")
+    for count in counts:
+        _seed(count, rng)
+        with SessionLocal() as db:
+            assert len(_search(RARE, user)(db).body) > 2
+            assert len(_search(COMMON, user)(db).body) > 2
+        rare = _best(_search(RARE, user))
+        common = _best(_search(COMMON, user))
+        like = _best(_like)
+        print(f"{count:>10,}{rare * 1e3:>16.2f}{common * 1e3:>18.2f}{like * 1e3:>16.2f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,87 @@
+# Response serialization cost per 10k rows. "before" is the previous path:
+# ORM entities validated through EventOut, jsonable_encoder, then json.dumps
+# as JSONResponse renders it. "after" reads plain column rows into dicts and
+# renders them with orjson. Both columns include the SQLite fetch, so the
+# saving is end to end.
+#
+#   python -m bench.bench_serialization
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from sqlalchemy import insert, select  # noqa: E402
+from db.session import Base, SessionLocal, engine  # noqa: E402
+import main  # noqa: E402,F401  (registers every model)
+from models.event import Event  # noqa: E402
+from models.user import User  # noqa: E402
+from routers.event import EVENT_OUT_FIELDS  # noqa: E402
+from schemas.event import EventOut  # noqa: E402
+from utils.json_response import FastJSONResponse  # noqa: E402
+
+START = datetime(2024, 1, 1)
+
+
+def _json_dumps(content) -> bytes:
+    # starlette.responses.JSONResponse.render
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def _seed(rows: int):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add(User(id=1, username="bench", email="bench@example.com", hashed_password="x"))
+        db.flush()
+        db.execute(insert(Event), [
+            {"title": f"event {i}", "description": "Weekly planning " * 4,
+             "timestamp": START + timedelta(hours=i), "end_time": START + timedelta(hours=i, minutes=30),
+             "created_by": 1}
+            for i in range(rows)
+        ])
+        db.commit()
+
+
+def _events_before(db):
+    events = db.execute(select(Event).order_by(Event.timestamp, Event.id)).scalars().all()
+    return _json_dumps(jsonable_encoder([EventOut.from_orm(e) for e in events]))
+
+
+def _events_after(db):
+    rows = db.execute(
+        select(*(getattr(Event, field) for field in EVENT_OUT_FIELDS))
+        .order_by(Event.timestamp, Event.id)
+    ).all()
+    return FastJSONResponse([dict(zip(EVENT_OUT_FIELDS, row)) for row in rows]).body
+
+
+def _best(fn, repeat: int) -> tuple[float, bytes]:
+    timings = []
+    for _ in range(repeat):
+        with SessionLocal() as db:
+            started = time.perf_counter()
+            body = fn(db)
+            timings.append(time.perf_counter() - started)
+    return min(timings), body
+
+
+def run(rows: int = 10_000, repeat: int = 5):
+    _seed(rows)
+    cases = [
+        ("GET /api/events", _events_before, _events_after),
+    ]
+    print(f"{'per ' + format(rows, ',') + ' rows':<22}{'before (ms)':>12}{'after (ms)':>12}{'speedup':>9}")
+    for name, before, after in cases:
+        before_s, before_body = _best(before, repeat)
+        after_s, after_body = _best(after, repeat)
+        assert json.loads(before_body) == json.loads(after_body), name
+        print(f"{name:<22}{before_s * 1e3:>12.1f}{after_s * 1e3:>12.1f}{before_s / after_s:>8.1f}x")
+
+
+if __name__ == "__main__":
+    run()
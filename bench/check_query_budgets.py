@@ -0,0 +1,226 @@
+# Statement budgets for every route in routers/event.py and
+# routers/sharing.py. Seeds a throwaway SQLite database with enough rows
+# that a per-row query (an N+1) would blow the budget, sends one request
+# per route straight to main.app and counts the statements it runs. The
+# user cache is cleared before each request, so every count includes the
+# user lookup of a cold cache. Exits non-zero when a route exceeds its
+# budget or a route has no budget; --verbose prints the SQL of each request.
+#
+#   python -m bench.check_query_budgets
+#   DB_MODE=async python -m bench.check_query_budgets
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "budgets.db"))
+os.environ.setdefault("SECRET_KEY", "budget-check")
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+
+import main  # noqa: E402
+from core import auth  # noqa: E402
+from core.security import create_access_token  # noqa: E402
+from db.query_budget import count_queries  # noqa: E402
+from db.session import Base, SessionLocal, engine  # noqa: E402
+from models.user import User  # noqa: E402
+from routers import event as event_router, sharing as sharing_router  # noqa: E402
+
+# Rows per collection; only PUT /batch may scale with it
+ROWS = 25
+HISTORY_DEPTH = 12
+START = datetime(2024, 1, 1)
+
+# (method, route) -> most statements one request may run. Lower a budget
+# when a route gets cheaper; raise one only with a reason next to it.
+BUDGETS = {
+    ("POST", "/"): 3,
+    ("POST", "/batch"): 2,
+    ("PUT", "/batch"): 4 + ROWS,  # one compare-and-swap UPDATE per event
+    ("POST", "/batch/delete"): 5,
+    ("POST", "/import"): 2,
+    ("GET", "/"): 2,
+    ("GET", "/window"): 2,
+    ("GET", "/occurrences"): 2,
+    ("GET", "/search"): 2,
+    ("GET", "/conflicts"): 3,
+    ("GET", "/export"): 2,
+    ("GET", "/export/history"): 2,
+    ("GET", "/{id}"): 2,
+    ("PUT", "/{id}"): 6,
+    ("DELETE", "/{id}"): 7,
+    ("GET", "/{id}/history"): 3,
+    ("GET", "/{id}/diff/{version_id}/current"): 3,
+    ("GET", "/{id}/diff/{version1_id}/{version2_id}"): 4,  # steps=true counts the range first
+    ("POST", "/{id}/rollback/{version_id}"): 7,
+    ("GET", "/{id}/history/{version_id}"): 3,
+    ("GET", "/{id}/changelog"): 3,
+    ("POST", "/share"): 5,
+    ("POST", "/share/bulk"): 5,
+    ("POST", "/share/bulk/revoke"): 4,
+    ("GET", "/{id}/permissions"): 3,
+    ("PUT", "/{id}/permissions/{user_id}"): 5,
+    ("DELETE", "/{id}/permissions/{user_id}"): 5,
+}
+
+
+async def _send(method: str, url: str, user: str, body=None, raw: bytes | None = None) -> tuple[int, bytes]:
+    # One request through the ASGI app, without an HTTP client
+    path, _, query = url.partition("?")
+    payload = raw if raw is not None else json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"budget-check"), (b"content-type", b"application/json"),
+                    (b"authorization", f"Bearer {create_access_token({'sub': user})}".encode())],
+        "client": ("127.0.0.1", 0), "server": ("budget-check", 80),
+    }
+    pending = [{"type": "http.request", "body": payload, "more_body": False}]
+    response = {"status": 0, "body": b""}
+
+    async def receive():
+        if pending:
+            return pending.pop()
+        await asyncio.Event().wait()  # never disconnects
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await main.app(scope, receive, send)
+    return response["status"], response["body"]
+
+
+async def _json(method, url, user="alice", body=None):
+    status, content = await _send(method, url, user, body)
+    if status >= 400:
+        raise RuntimeError(f"setup request {method} {url} failed with {status}: {content[:200]!r}")
+    return json.loads(content) if content else None
+
+
+def _seed_users():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        for name in ("alice", "bob", "carol"):
+            db.add(User(username=name, email=f"{name}@example.com", hashed_password="x", role="user"))
+        db.commit()
+        return {user.username: user.id for user in db.query(User)}
+
+
+def _events(count: int, title: str = "event") -> list[dict]:
+    return [
+        {"title": f"{title} {i}", "description": "notes", "timestamp": (START + timedelta(hours=5 * i)).isoformat(),
+         "duration_minutes": 360 if i % 2 else 30,
+         **({"recurrence": {"freq": "weekly", "count": 10}} if i % 10 == 0 else {})}
+        for i in range(count)
+    ]
+
+
+async def _event_with_history(title: str, users: dict) -> tuple[int, list[int]]:
+    # An event shared with bob and carol and edited HISTORY_DEPTH times
+    event_id = (await _json("POST", "/api/events/", body=_events(1, title)[0]))["id"]
+    await _json("POST", "/api/events/share", body={"event_id": event_id, "user_id": users["bob"], "role": "viewer"})
+    await _json("POST", "/api/events/share", body={"event_id": event_id, "user_id": users["carol"], "role": "editor"})
+    for version in range(HISTORY_DEPTH):
+        await _json("PUT", f"/api/events/{event_id}", body={"title": f"{title} v{version}"})
+    history = await _json("GET", f"/api/events/{event_id}/history")
+    return event_id, [h["id"] for h in history]
+
+
+async def _cases(users: dict):
+    # (method, route, url, body) per route; rows created here while
+    # preparing a case are not counted
+    owned = [e["id"] for e in await _json("POST", "/api/events/batch", body={"events": _events(ROWS)})]
+    await _json("POST", "/api/events/share/bulk", body={
+        "event_ids": owned, "user_ids": [users["bob"], users["carol"]], "role": "editor"})
+    for e in await _json("POST", "/api/events/batch", user="bob", body={"events": _events(ROWS, "bob")}):
+        await _json("POST", "/api/events/share", user="bob", body={"event_id": e["id"], "user_id": users["alice"], "role": "viewer"})
+    deep, versions = await _event_with_history("deep", users)
+    window = f"start={START.isoformat()}&end={(START + timedelta(days=30)).isoformat()}"
+
+    async def fresh(title):
+        return (await _event_with_history(title, users))[0]
+
+    yield "POST", "/", "/api/events/", _events(1)[0]
+    yield "POST", "/batch", "/api/events/batch", {"events": _events(ROWS)}
+    yield "PUT", "/batch", "/api/events/batch", {"events": [{"id": i, "title": "batch"} for i in owned]}
+    doomed = [e["id"] for e in await _json("POST", "/api/events/batch", body={"events": _events(ROWS)})]
+    yield "POST", "/batch/delete", "/api/events/batch/delete", {"ids": doomed}
+    yield "POST", "/import", "/api/events/import", "\n".join(json.dumps(e) for e in _events(ROWS)).encode()
+    yield "GET", "/", "/api/events/?limit=100", None
+    yield "GET", "/window", f"/api/events/window?{window}", None
+    yield "GET", "/occurrences", f"/api/events/occurrences?{window}", None
+    yield "GET", "/search", "/api/events/search?q=event+notes&limit=10", None
+    yield "GET", "/conflicts", f"/api/events/conflicts?{window}", None
+    yield "GET", "/export", "/api/events/export", None
+    yield "GET", "/export/history", "/api/events/export/history", None
+    yield "GET", "/{id}", f"/api/events/{deep}", None
+    yield "PUT", "/{id}", f"/api/events/{owned[0]}", {"title": "changed"}
+    yield "DELETE", "/{id}", f"/api/events/{await fresh('doomed')}", None
+    yield "GET", "/{id}/history", f"/api/events/{deep}/history?limit=5", None
+    yield "GET", "/{id}/diff/{version_id}/current", f"/api/events/{deep}/diff/{versions[3]}/current", None
+    yield ("GET", "/{id}/diff/{version1_id}/{version2_id}",
+           f"/api/events/{deep}/diff/{versions[1]}/{versions[-1]}?steps=true", None)
+    yield "GET", "/{id}/history/{version_id}", f"/api/events/{deep}/history/{versions[5]}", None
+    yield "GET", "/{id}/changelog", f"/api/events/{deep}/changelog", None
+    yield "POST", "/{id}/rollback/{version_id}", f"/api/events/{deep}/rollback/{versions[2]}", None
+    solo = (await _json("POST", "/api/events/", body=_events(1, "solo")[0]))["id"]
+    yield "POST", "/share", "/api/events/share", {"event_id": solo, "user_id": users["bob"], "role": "viewer"}
+    yield "POST", "/share/bulk", "/api/events/share/bulk", {
+        "event_ids": owned, "user_ids": [users["bob"], users["carol"]], "role": "viewer"}
+    yield "POST", "/share/bulk/revoke", "/api/events/share/bulk/revoke", {
+        "event_ids": owned, "user_ids": [users["carol"]]}
+    yield "GET", "/{id}/permissions", f"/api/events/{deep}/permissions", None
+    yield ("PUT", "/{id}/permissions/{user_id}",
+           f"/api/events/{deep}/permissions/{users['bob']}?role=editor", {"role": "editor"})
+    yield "DELETE", "/{id}/permissions/{user_id}", f"/api/events/{deep}/permissions/{users['bob']}", None
+
+
+def _routes() -> set[tuple[str, str]]:
+    return {
+        (method, route.path)
+        for router in (event_router.router, sharing_router.router)
+        for route in router.routes for method in route.methods
+    }
+
+
+async def run(verbose: bool = False) -> int:
+    users = _seed_users()
+    failures, checked = [], set()
+    print(f"{'route':<50}{'statements':>11}{'budget':>8}")
+    async for method, route, url, body in _cases(users):
+        auth.user_cache.clear()
+        raw = body if isinstance(body, bytes) else None
+        with count_queries() as counter:
+            status, content = await _send(method, url, "alice", None if raw else body, raw)
+        if status >= 400:
+            failures.append(f"{method} {route} answered {status}: {content[:200]!r}")
+        budget = BUDGETS.get((method, route))
+        checked.add((method, route))
+        mark = "" if budget is None or counter.count <= budget else "  OVER"
+        print(f"{method + ' ' + route:<50}{counter.count:>11}{budget if budget is not None else '-':>8}{mark}")
+        if verbose:
+            for statement in counter.statements:
+                print(f"    {' '.join(statement.split())[:160]}")
+        if budget is None:
+            failures.append(f"{method} {route} has no budget")
+        elif counter.count > budget:
+            failures.append(f"{method} {route} ran {counter.count} statements, budget is {budget}")
+
+    for method, route in sorted(_routes() - checked):
+        failures.append(f"{method} {route} has no budget check")
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check per-route SQL statement budgets")
+    parser.add_argument("--verbose", action="store_true", help="print each request's SQL")
+    sys.exit(asyncio.run(run(parser.parse_args().verbose)))
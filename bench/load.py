@@ -0,0 +1,395 @@
+# Load test for the HTTP API. Seeds a scratch database with users, events,
+# shares and deep version histories, starts main.app under uvicorn in a
+# subprocess, and drives one endpoint at a time with concurrent keep-alive
+# clients (one thread and connection each). Reports throughput and latency
+# percentiles per endpoint and writes them as JSON; --compare prints the
+# change against an earlier run. Everything runs locally: SQLite in a temp
+# directory by default, or any scratch database given with --database-url
+# (its tables are dropped and recreated).
+#
+#   python -m bench.load
+#   python -m bench.load --clients 32 --duration 20 --compare bench/results/before.json
+#   python -m bench.load --database-url postgresql://bench@localhost/bench_scratch --db-mode async
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+START = datetime(2024, 1, 1)
+ROLES = ("viewer", "editor")
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Load test for the HTTP API")
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"))
+    parser.add_argument("--db-mode", choices=("sync", "async"), default=os.environ.get("DB_MODE", "sync"))
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per endpoint")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds per endpoint, not recorded")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--events-per-user", type=int, default=200)
+    parser.add_argument("--shares-per-event", type=int, default=3)
+    parser.add_argument("--deep-events", type=int, default=20, help="events with a long history")
+    parser.add_argument("--history-depth", type=int, default=500)
+    parser.add_argument("--scenarios", nargs="*", help="run only these endpoints")
+    parser.add_argument("--output", help="results file (default bench/results/<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def _configure(args) -> dict:
+    # Settings and db.session read the environment on import, so it is set
+    # up before anything from the app is imported; the server inherits it.
+    url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = url
+    os.environ["DB_MODE"] = args.db_mode
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+    return dict(os.environ)
+
+
+# -- seeding ----------------------------------------------------------------
+
+def _seed(args, rng: random.Random) -> dict:
+    from sqlalchemy import insert, select
+    from db.session import Base, SessionLocal, engine
+    import main  # noqa: F401  (registers every model)
+    from core.history import snapshot_event
+    from models.event import Event
+    from models.event_history import EventHistory
+    from models.shared_access import SharedAccess
+    from models.user import User
+    from passlib.context import CryptContext
+    from utils.intervals import span_bucket
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    hashed = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("bench-password")
+
+    with SessionLocal() as db:
+        db.execute(insert(User), [
+            {"id": u, "username": f"user{u}", "email": f"user{u}@example.com",
+             "hashed_password": hashed, "role": "user"}
+            for u in range(1, args.users + 1)
+        ])
+
+        # Events spread over a year, a third of them with an end time and
+        # one in twenty recurring weekly
+        rows = []
+        for u in range(1, args.users + 1):
+            for i in range(args.events_per_user):
+                timestamp = START + timedelta(minutes=rng.randrange(365 * 24 * 60))
+                end_time = timestamp + timedelta(minutes=rng.choice((30, 60, 90))) if i % 3 == 0 else None
+                rows.append({
+                    "title": f"event {u}-{i}", "description": "Planning notes " * rng.randint(1, 8),
+                    "timestamp": timestamp, "end_time": end_time, "created_by": u,
+                    "span_bucket": span_bucket(timestamp, end_time),
+                    "recurrence": {"freq": "weekly", "interval": 1, "count": 52, "until": None,
+                                   "by_weekday": None, "exdates": [], "overrides": []}
+                    if i % 20 == 0 else None,
+                })
+        db.execute(insert(Event), rows)
+        events = db.execute(select(Event.id, Event.created_by)).all()
+
+        owned, shared, shares = {}, {}, []
+        for event_id, owner in events:
+            owned.setdefault(owner, []).append(event_id)
+            others = [u for u in range(1, args.users + 1) if u != owner]
+            for user_id in rng.sample(others, min(args.shares_per_event, len(others))):
+                role = rng.choice(ROLES)
+                shares.append({"user_id": user_id, "event_id": event_id, "role": role})
+                shared.setdefault(user_id, []).append(event_id)
+        db.execute(insert(SharedAccess), shares)
+
+        # Deep histories on the first events of the first users, stored as
+        # full snapshots; the event version counts every recorded change
+        deep = {}
+        history = []
+        for event_id, owner in events[:args.deep_events]:
+            event = db.get(Event, event_id)
+            base = snapshot_event(event)
+            for version in range(1, args.history_depth + 1):
+                history.append({
+                    "event_id": event_id, "changed_by": owner, "version": version, "is_delta": False,
+                    "change_time": START + timedelta(minutes=version),
+                    "previous_data": json.dumps({**base, "title": f"{base['title']} v{version}"}),
+                })
+            event.version = args.history_depth + 1
+            deep.setdefault(owner, []).append(event_id)
+        for start in range(0, len(history), 5000):
+            db.execute(insert(EventHistory), history[start:start + 5000])
+        db.commit()
+
+        version_ids = {}
+        for event_id, history_id in db.execute(
+                select(EventHistory.event_id, EventHistory.id).order_by(EventHistory.id)):
+            version_ids.setdefault(event_id, []).append(history_id)
+
+    return {
+        "owned": owned, "shared": shared, "deep": deep, "version_ids": version_ids,
+        "counts": {"users": args.users, "events": len(events), "shares": len(shares),
+                   "history_rows": len(history)},
+    }
+
+
+def _tokens(users: int) -> dict[int, str]:
+    from core.security import create_access_token
+    return {u: create_access_token({"sub": f"user{u}"}) for u in range(1, users + 1)}
+
+
+# -- server -----------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(env: dict, port: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start within 30s")
+
+
+# -- scenarios --------------------------------------------------------------
+
+def _window(rng):
+    start = START + timedelta(days=rng.randrange(358))
+    return {"start": start.isoformat(), "end": (start + timedelta(days=7)).isoformat()}
+
+
+def _scenarios(data: dict) -> dict:
+    # name -> fn(rng, user_id) returning (method, path, body)
+    owned, shared, deep, version_ids = data["owned"], data["shared"], data["deep"], data["version_ids"]
+    deep_users = sorted(deep)
+
+    def accessible(rng, user_id):
+        return rng.choice(owned[user_id] + shared.get(user_id, []))
+
+    def deep_event(rng):
+        user_id = rng.choice(deep_users)
+        return user_id, rng.choice(deep[user_id])
+
+    def diff(rng, user_id):
+        _, event_id = deep_event(rng)
+        v1, v2 = sorted(rng.sample(version_ids[event_id], 2))
+        return "GET", f"/api/events/{event_id}/diff/{v1}/{v2}", None
+
+    def update(rng, user_id):
+        return "PUT", f"/api/events/{rng.choice(owned[user_id])}", {"title": f"edit {rng.random():.6f}"}
+
+    def create(rng, user_id):
+        timestamp = START + timedelta(minutes=rng.randrange(365 * 24 * 60))
+        return "POST", "/api/events/", {"title": "load", "description": "load test",
+                                        "timestamp": timestamp.isoformat(), "duration_minutes": 30}
+
+    # History endpoints act as the owner of a deep event, set per request
+    return {
+        "list_events": lambda rng, u: ("GET", "/api/events/?limit=50", None),
+        "list_window": lambda rng, u: ("GET", "/api/events/window?" + urlencode(_window(rng)), None),
+        "occurrences": lambda rng, u: ("GET", "/api/events/occurrences?" + urlencode(_window(rng)), None),
+        "get_event": lambda rng, u: ("GET", f"/api/events/{accessible(rng, u)}", None),
+        "permissions": lambda rng, u: ("GET", f"/api/events/{rng.choice(owned[u])}/permissions", None),
+        "history": lambda rng, u: ("GET", f"/api/events/{deep_event(rng)[1]}/history", None),
+        "changelog": lambda rng, u: ("GET", f"/api/events/{deep_event(rng)[1]}/changelog", None),
+        "diff": diff,
+        "create_event": create,
+        "update_event": update,
+    }
+
+
+DEEP_SCENARIOS = {"history", "changelog", "diff"}
+
+
+def _client(port, token_for, user_id, make_request, seed, stop, record, results):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    latencies, statuses = [], {}
+    while not stop.is_set():
+        method, path, body = make_request(rng, user_id)
+        headers = {"Authorization": f"Bearer {token_for(path, user_id)}"}
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            status = 0
+        if record.is_set():
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+    conn.close()
+    results.append((latencies, statuses))
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    # Nearest rank
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+def _run_scenario(name, make_request, args, port, tokens, data) -> dict:
+    deep_owner = {event_id: user_id for user_id, ids in data["deep"].items() for event_id in ids}
+
+    def token_for(path, user_id):
+        if name in DEEP_SCENARIOS:
+            return tokens[deep_owner[int(path.split("/")[3])]]
+        return tokens[user_id]
+
+    stop, record, results = threading.Event(), threading.Event(), []
+    threads = [
+        threading.Thread(target=_client, args=(
+            port, token_for, 1 + i % args.users, make_request, args.seed * 1000 + i, stop, record, results))
+        for i in range(args.clients)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    record.set()
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    stop.set()
+    elapsed = time.perf_counter() - started
+    for thread in threads:
+        thread.join()
+
+    latencies = sorted(latency for result, _ in results for latency in result)
+    statuses = {}
+    for _, counts in results:
+        for status, count in counts.items():
+            statuses[str(status)] = statuses.get(str(status), 0) + count
+    errors = sum(count for status, count in statuses.items() if not 200 <= int(status) < 400)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": statuses,
+        "throughput_rps": len(latencies) / elapsed,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) * 1e3 if latencies else 0.0,
+            "p50": _percentile(latencies, 0.50) * 1e3,
+            "p95": _percentile(latencies, 0.95) * 1e3,
+            "p99": _percentile(latencies, 0.99) * 1e3,
+            "max": (latencies[-1] if latencies else 0.0) * 1e3,
+        },
+    }
+
+
+# -- reporting --------------------------------------------------------------
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_results(results: dict, baseline: dict | None):
+    header = f"{'endpoint':<14}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+    print(header + ("   vs baseline (req/s, p99)" if baseline else ""))
+    for name, result in results["scenarios"].items():
+        latency = result["latency_ms"]
+        line = (f"{name:<14}{result['throughput_rps']:>9.1f}{latency['p50']:>9.2f}"
+                f"{latency['p95']:>9.2f}{latency['p99']:>9.2f}{result['errors']:>8}")
+        before = (baseline or {}).get("scenarios", {}).get(name)
+        if before and before["throughput_rps"] and before["latency_ms"]["p99"]:
+            rps = result["throughput_rps"] / before["throughput_rps"] - 1
+            p99 = latency["p99"] / before["latency_ms"]["p99"] - 1
+            line += f"   {rps:+7.1%} {p99:+7.1%}"
+        print(line)
+
+
+def main():
+    args = _parse_args()
+    env = _configure(args)
+    rng = random.Random(args.seed)
+
+    scenario_names = list(_scenarios({"owned": {}, "shared": {}, "deep": {}, "version_ids": {}}))
+    unknown = set(args.scenarios or ()) - set(scenario_names)
+    if unknown:
+        sys.exit(f"unknown scenarios: {', '.join(sorted(unknown))}; choose from {', '.join(scenario_names)}")
+
+    print("seeding...", flush=True)
+    seeded_at = time.perf_counter()
+    data = _seed(args, rng)
+    print(f"seeded {data['counts']} in {time.perf_counter() - seeded_at:.1f}s", flush=True)
+    tokens = _tokens(args.users)
+    scenarios = _scenarios(data)
+
+    port = _free_port()
+    server = _start_server(env, port)
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "database": env["DATABASE_URL"].split(":", 1)[0],
+            "db_mode": args.db_mode,
+            "clients": args.clients,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "seed": args.seed,
+            "data": data["counts"],
+        },
+        "scenarios": {},
+    }
+    try:
+        for name in args.scenarios or scenario_names:
+            print(f"running {name}...", flush=True)
+            results["scenarios"][name] = _run_scenario(name, scenarios[name], args, port, tokens, data)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "results", datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print()
+    _print_results(results, baseline)
+    print(f"\nresults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
-from db.session import SessionLocal
+from db.session import get_db, with_db_mode
 from models.user import User
+from core.cache import TTLCache
+from core.config import settings
+from core.revocation import is_token_revoked
 from dotenv import load_dotenv
 import os
 
@@ -14,15 +20,60 @@ ALGORITHM = os.getenv("ALGORITHM")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@dataclass(frozen=True)
+class UserSnapshot:
+    # Detached copy of the columns handlers read from the current user, safe
+    # to keep across requests and sessions.
+    id: int
+    username: str
+    email: str
+    role: str
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        return cls(id=user.id, username=user.username, email=user.email, role=user.role)
+
+
+user_cache = TTLCache(settings.USER_CACHE_MAX_SIZE, settings.USER_CACHE_TTL_SECONDS)
+token_cache = TTLCache(
+    settings.TOKEN_CACHE_MAX_SIZE if settings.TRUST_VERIFIED_TOKENS else 0)
+
+
+def invalidate_user(username: str | None = None):
+    if username is None:
+        user_cache.clear()
+    else:
+        user_cache.pop(username)
+
+
+def user_cache_stats() -> dict:
+    return {"users": user_cache.stats(), "tokens": token_cache.stats()}
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_user(target.username)
+    for old_username in inspect(target).attrs.username.history.deleted:
+        invalidate_user(old_username)
+
+
+def decode_token(token: str) -> dict:
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    exp = payload.get("exp")
+    if exp is not None:
+        remaining = exp - datetime.now(timezone.utc).timestamp()
+        if remaining > 0:
+            token_cache.set(token, payload, ttl=remaining)
+    return payload
+
+
+@with_db_mode
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> UserSnapshot:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate token",
@@ -30,14 +81,20 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     )
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         username: str = payload.get("sub")
-        if not username:
+        if not username or payload.get("type") != "access":
+            raise credentials_exception
+        if is_token_revoked(payload):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.username == username).first()
+    user = user_cache.get(username)
     if user is None:
-        raise credentials_exception
+        db_user = db.query(User).filter(User.username == username).first()
+        if db_user is None:
+            raise credentials_exception
+        user = UserSnapshot.from_user(db_user)
+        user_cache.set(username, user)
     return user
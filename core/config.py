@@ -5,6 +5,67 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
 
+    # "sync" runs handlers on the threadpool, "async" on an AsyncEngine
+    DB_MODE: str = "sync"
+    ASYNC_DATABASE_URL: str | None = None
+
+    # Connection pool (db/pool.py)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
+    # Event history storage: "snapshot" stores every version in full,
+    # "delta" stores field deltas with a full checkpoint every N versions
+    HISTORY_STORAGE: str = "snapshot"
+    HISTORY_CHECKPOINT_INTERVAL: int = 10
+    DIFF_CACHE_MAX_SIZE: int = 5000
+
+    # History retention (db/archive_history.py): the newest
+    # HISTORY_RETAIN_VERSIONS versions of an event and every version newer
+    # than HISTORY_RETAIN_DAYS stay in event_history; older ones are moved
+    # to compressed NDJSON segments in HISTORY_ARCHIVE_DIR ("gzip", or
+    # "zstd" with the zstandard package). Set HISTORY_ARCHIVE_INTERVAL_SECONDS
+    # to run the job in the background of every app process.
+    HISTORY_RETAIN_VERSIONS: int = 50
+    HISTORY_RETAIN_DAYS: int = 90
+    HISTORY_ARCHIVE_DIR: str = "history_archive"
+    HISTORY_ARCHIVE_COMPRESSION: str = "gzip"
+    HISTORY_ARCHIVE_SEGMENT_BYTES: int = 64 * 1024 * 1024
+    HISTORY_ARCHIVE_INTERVAL_SECONDS: float | None = None
+
+    # Expose /internal diagnostics endpoints, to requests carrying
+    # INTERNAL_TOKEN in an X-Internal-Token header
+    INTERNAL_ENDPOINTS_ENABLED: bool = False
+    INTERNAL_TOKEN: str | None = None
+
+    # Authenticated user cache (core/auth.py)
+    USER_CACHE_TTL_SECONDS: int = 60
+    USER_CACHE_MAX_SIZE: int = 10000
+    # Skip re-verifying the signature of a token already seen, until it expires
+    TRUST_VERIFIED_TOKENS: bool = False
+    TOKEN_CACHE_MAX_SIZE: int = 10000
+
+    # Password hashing (core/hash_pool.py): bcrypt cost, worker processes
+    # (0 hashes on the threadpool instead) and how many hash jobs may be
+    # running or waiting before requests are turned away with a 503
+    PASSWORD_HASH_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_SIZE: int = 32
+
+    # Per-request metrics (core/request_metrics.py): requests slower than
+    # SLOW_REQUEST_MS are logged with their SQL, at most
+    # SLOW_REQUEST_MAX_STATEMENTS statements each; unset disables the log
+    SLOW_REQUEST_MS: float | None = None
+    SLOW_REQUEST_MAX_STATEMENTS: int = 50
+
+    # Token revocation (core/revocation.py): "sql" persists revocations in
+    # the database and syncs them into each process every few seconds,
+    # "memory" keeps them in this process only
+    TOKEN_REVOCATION_BACKEND: str = "sql"
+    REVOCATION_SYNC_SECONDS: float = 5.0
+
     class Config:
         env_file = ".env"
 
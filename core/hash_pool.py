@@ -0,0 +1,106 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from core import security
+from core.config import settings
+from core.metrics import Counter, Histogram
+
+# bcrypt runs in its own worker processes, so a burst of logins can neither
+# hold the GIL nor take Starlette's threadpool away from other endpoints.
+# Jobs beyond PASSWORD_HASH_QUEUE_SIZE are rejected instead of queued.
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+hash_seconds = Histogram(HASH_BUCKETS)  # time spent hashing in a worker
+wait_seconds = Histogram(HASH_BUCKETS)  # submit to result, queueing included
+queue_depth = Histogram(range(settings.PASSWORD_HASH_QUEUE_SIZE + 1))  # jobs ahead at submit
+completed = Counter()
+rejected = Counter()
+
+_lock = threading.Lock()
+_in_flight = 0
+_peak = 0
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # spawn: forking a process that already runs threads and holds
+        # pooled DB connections is not safe
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+async def _submit(fn, *args):
+    global _in_flight, _peak
+    with _lock:
+        if _in_flight >= settings.PASSWORD_HASH_QUEUE_SIZE:
+            rejected.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication is busy, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        queue_depth.observe(_in_flight)
+        _in_flight += 1
+        _peak = max(_peak, _in_flight)
+
+    started = time.perf_counter()
+    try:
+        if settings.PASSWORD_HASH_WORKERS > 0:
+            loop = asyncio.get_running_loop()
+            result, elapsed = await loop.run_in_executor(_get_executor(), _timed, fn, *args)
+        else:
+            result, elapsed = await run_in_threadpool(_timed, fn, *args)
+    finally:
+        with _lock:
+            _in_flight -= 1
+    hash_seconds.observe(elapsed)
+    wait_seconds.observe(time.perf_counter() - started)
+    completed.inc()
+    return result
+
+
+async def hash_password(password: str) -> str:
+    return await _submit(security.get_password_hash, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    # (valid, new_hash) as returned by security.verify_and_update
+    return await _submit(security.verify_and_update, password, hashed_password)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def hash_pool_stats() -> dict:
+    with _lock:
+        in_flight, peak = _in_flight, _peak
+    return {
+        "workers": settings.PASSWORD_HASH_WORKERS,
+        "queue_size": settings.PASSWORD_HASH_QUEUE_SIZE,
+        "rounds": settings.PASSWORD_HASH_ROUNDS,
+        "in_flight": in_flight,
+        "peak_in_flight": peak,
+        "completed": completed.value,
+        "rejected": rejected.value,
+        "hash_seconds": hash_seconds.snapshot(),
+        "wait_seconds": wait_seconds.snapshot(),
+        "queue_depth": queue_depth.snapshot(),
+    }
@@ -0,0 +1,322 @@
+import json
+from datetime import datetime
+from itertools import islice
+from typing import NamedTuple
+from sqlalchemy import and_, func, insert, or_, select
+from sqlalchemy.orm import Session
+from core.config import settings
+from core.cache import TTLCache
+from core.permissions import IN_CHUNK_SIZE
+from models.event import Event
+from models.event_history import EventHistory
+from models.history_archive import HistoryArchive
+from utils.archive_segments import read_member
+from utils.diff_utlis import apply_delta, diff_fields, field_delta
+from utils.pagination import DEFAULT_PAGE_SIZE
+
+SNAPSHOT_FIELDS = ("title", "description", "timestamp", "end_time", "recurrence")
+DATETIME_FIELDS = {"timestamp", "end_time"}
+MAX_DIFF_STEPS = 500
+
+# History rows never change once written, so a diff between two version
+# IDs can be reused for as long as it stays in the cache.
+diff_cache = TTLCache(settings.DIFF_CACHE_MAX_SIZE)
+
+
+def snapshot_event(event: Event) -> dict:
+    data = {field: getattr(event, field) for field in SNAPSHOT_FIELDS}
+    for field in DATETIME_FIELDS:
+        if data.get(field) is not None:
+            data[field] = data[field].isoformat()
+    return data
+
+
+def restore_snapshot(event: Event, data: dict):
+    for field in SNAPSHOT_FIELDS:
+        if field not in data:
+            continue
+        value = data[field]
+        if field in DATETIME_FIELDS and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        setattr(event, field, value)
+
+
+class ArchivedVersion(NamedTuple):
+    # An event_history row read back from an archive segment
+    id: int
+    event_id: int
+    changed_by: int | None
+    change_time: datetime | None
+    version: int | None
+    is_delta: bool = False
+
+
+def _is_checkpoint_version(version: int) -> bool:
+    return (version - 1) % settings.HISTORY_CHECKPOINT_INTERVAL == 0
+
+
+def _latest_versions(db: Session, event_ids: list[int]) -> dict[int, tuple[int, dict | None]]:
+    # Latest version number per event and, in delta mode, the reconstructed
+    # data of that version (its checkpoint plus the deltas after it).
+    latest = {}
+    delta_mode = settings.HISTORY_STORAGE == "delta"
+    for start in range(0, len(event_ids), IN_CHUNK_SIZE):
+        chunk = event_ids[start:start + IN_CHUNK_SIZE]
+        if not delta_mode:
+            rows = db.execute(
+                select(EventHistory.event_id, func.max(EventHistory.version))
+                .where(EventHistory.event_id.in_(chunk))
+                .group_by(EventHistory.event_id)
+            ).all()
+            latest.update({event_id: (version or 0, None) for event_id, version in rows})
+            continue
+
+        checkpoints = select(
+            EventHistory.event_id, func.max(EventHistory.id).label("checkpoint_id")
+        ).where(
+            EventHistory.event_id.in_(chunk), EventHistory.is_delta.is_(False)
+        ).group_by(EventHistory.event_id).subquery()
+        tail = db.execute(
+            select(EventHistory.event_id, EventHistory.version,
+                   EventHistory.is_delta, EventHistory.previous_data)
+            .join(checkpoints, and_(
+                EventHistory.event_id == checkpoints.c.event_id,
+                EventHistory.id >= checkpoints.c.checkpoint_id))
+            .order_by(EventHistory.event_id, EventHistory.id)
+        ).all()
+        for event_id, version, is_delta, previous_data in tail:
+            stored = json.loads(previous_data)
+            _, data = latest.get(event_id, (0, {}))
+            latest[event_id] = (version or 0, apply_delta(data, stored) if is_delta else stored)
+    return latest
+
+
+def record_history(db: Session, events: list[Event], user_id: int) -> list[dict]:
+    # Stores the current state of each event as its next version with one
+    # multi-row INSERT. Call before applying the change.
+    if not events:
+        return []
+    latest = _latest_versions(db, [e.id for e in events])
+    rows = []
+    for event in events:
+        data = snapshot_event(event)
+        last_version, last_data = latest.get(event.id, (0, None))
+        version = last_version + 1
+        is_delta = last_data is not None and not _is_checkpoint_version(version)
+        rows.append({
+            "event_id": event.id,
+            "changed_by": user_id,
+            "version": version,
+            "is_delta": is_delta,
+            "previous_data": json.dumps(field_delta(last_data, data) if is_delta else data),
+        })
+    db.execute(insert(EventHistory), rows)
+    return rows
+
+
+def _reconstruct(rows: list[EventHistory]) -> list[tuple[EventHistory, dict]]:
+    versions, data = [], {}
+    for row in rows:
+        stored = json.loads(row.previous_data)
+        data = apply_delta(data, stored) if row.is_delta else stored
+        versions.append((row, data))
+    return versions
+
+
+def load_version(db: Session, event_id: int, version_id: int) -> tuple[EventHistory, dict] | None:
+    # Reads the target row together with its nearest checkpoint and the
+    # deltas in between: at most HISTORY_CHECKPOINT_INTERVAL rows.
+    checkpoint_id = select(func.max(EventHistory.id)).where(
+        EventHistory.event_id == event_id,
+        EventHistory.id <= version_id,
+        EventHistory.is_delta.is_(False)
+    ).scalar_subquery()
+    rows = db.query(EventHistory).filter(
+        EventHistory.event_id == event_id,
+        EventHistory.id >= checkpoint_id,
+        EventHistory.id <= version_id
+    ).order_by(EventHistory.id).all()
+
+    if not rows or rows[-1].id != version_id:
+        archived = load_archived(db, event_id, version_id, version_id)
+        return archived[0] if archived else None
+    return _reconstruct(rows)[-1]
+
+
+def _page_criteria(after: tuple[datetime, int] | None, since: datetime | None) -> list:
+    criteria = []
+    if after is not None:
+        after_time, after_id = after
+        criteria.append(or_(
+            EventHistory.change_time > after_time,
+            and_(EventHistory.change_time == after_time, EventHistory.id > after_id)
+        ))
+    if since is not None:
+        criteria.append(EventHistory.change_time > since)
+    return criteria
+
+
+def _on_page(row, after: tuple[datetime, int] | None, since: datetime | None) -> bool:
+    if row.change_time is None:
+        return after is None and since is None
+    if after is not None and (row.change_time, row.id) <= after:
+        return False
+    return since is None or row.change_time > since
+
+
+def load_history_page(db: Session, event: Event, after: tuple[datetime, int] | None = None,
+                      since: datetime | None = None, limit: int = DEFAULT_PAGE_SIZE,
+                      archived: bool = False) -> tuple[list[tuple[EventHistory, dict]], bool]:
+    # Up to ``limit`` versions ordered by (change_time, id), after the
+    # ``after`` position and changed after ``since``, each with the fields
+    # its edit changed: the diff to the next version or, for the newest, to
+    # the event itself. The page is rebuilt from the checkpoint preceding it
+    # plus one extra row, in a single query. Also returns whether more
+    # versions follow.
+    versions = []
+    if archived:
+        archive = iter_archived(db, event.id, after[1] + 1 if after else None, changed_after=since)
+        versions = list(islice(
+            ((row, data) for row, data in archive if _on_page(row, after, since)), limit + 1))
+
+    if len(versions) <= limit:
+        page = select(EventHistory.id).where(
+            EventHistory.event_id == event.id, *_page_criteria(after, since)
+        ).order_by(EventHistory.change_time, EventHistory.id)
+        first_id = page.limit(1).scalar_subquery()
+        # The row after the page, or the newest one when the page is the last
+        last_id = func.coalesce(
+            page.offset(limit - len(versions)).limit(1).scalar_subquery(),
+            select(func.max(EventHistory.id)).where(EventHistory.event_id == event.id).scalar_subquery()
+        )
+        checkpoint_id = func.coalesce(select(func.max(EventHistory.id)).where(
+            EventHistory.event_id == event.id,
+            EventHistory.id <= first_id,
+            EventHistory.is_delta.is_(False)
+        ).scalar_subquery(), first_id)
+        rows = db.execute(
+            select(EventHistory.id, EventHistory.event_id, EventHistory.change_time,
+                   EventHistory.changed_by, EventHistory.is_delta, EventHistory.previous_data)
+            .where(EventHistory.event_id == event.id,
+                   EventHistory.id >= checkpoint_id, EventHistory.id <= last_id)
+            .order_by(EventHistory.id)
+        ).all()
+        versions += [(row, data) for row, data in _reconstruct(rows) if _on_page(row, after, since)]
+
+    has_more = len(versions) > limit
+    following = [data for _, data in versions[1:limit + 1]]
+    if not has_more:
+        following.append(snapshot_event(event))
+    return [
+        (row, diff_fields(data, next_data))
+        for (row, data), next_data in zip(versions[:limit], following)
+    ], has_more
+
+
+def load_range(db: Session, event_id: int, first_id: int, last_id: int) -> list[tuple[EventHistory, dict]]:
+    # Versions with first_id <= id <= last_id, reconstructed from the
+    # checkpoint preceding first_id in a single query. When first_id has
+    # been archived, the oldest row left (always a checkpoint) is the start
+    # and the archived part of the range is read from its segments.
+    checkpoint_id = func.coalesce(select(func.max(EventHistory.id)).where(
+        EventHistory.event_id == event_id,
+        EventHistory.id <= first_id,
+        EventHistory.is_delta.is_(False)
+    ).scalar_subquery(), 0)
+    rows = db.query(EventHistory).filter(
+        EventHistory.event_id == event_id,
+        EventHistory.id >= checkpoint_id,
+        EventHistory.id <= last_id
+    ).order_by(EventHistory.id).all()
+    versions = [(row, data) for row, data in _reconstruct(rows) if row.id >= first_id]
+    if not versions or versions[0][0].id > first_id:
+        versions = load_archived(db, event_id, first_id, last_id) + versions
+    return versions
+
+
+def load_archived(db: Session, event_id: int, first_id: int | None = None,
+                  last_id: int | None = None) -> list[tuple[ArchivedVersion, dict]]:
+    # Archived versions of an event, oldest first, optionally limited to
+    # first_id <= id <= last_id. Archived rows are stored as full snapshots,
+    # so each one stands on its own.
+    return list(iter_archived(db, event_id, first_id, last_id))
+
+
+def iter_archived(db: Session, event_id: int, first_id: int | None = None,
+                  last_id: int | None = None, changed_after: datetime | None = None):
+    # load_archived as a generator: a member is only read and decoded when
+    # the caller gets to it, so a caller that stops early reads no more.
+    # changed_after skips members whose versions are all older.
+    stmt = select(HistoryArchive).where(HistoryArchive.event_id == event_id)
+    if first_id is not None:
+        stmt = stmt.where(HistoryArchive.last_history_id >= first_id)
+    if last_id is not None:
+        stmt = stmt.where(HistoryArchive.first_history_id <= last_id)
+    if changed_after is not None:
+        stmt = stmt.where(HistoryArchive.last_change_time > changed_after)
+
+    for entry in db.execute(stmt.order_by(HistoryArchive.first_history_id)).scalars().all():
+        member = read_member(settings.HISTORY_ARCHIVE_DIR, entry.segment,
+                             entry.byte_offset, entry.byte_length, entry.codec)
+        for line in member.splitlines():
+            record = json.loads(line)
+            if first_id is not None and record["id"] < first_id:
+                continue
+            if last_id is not None and record["id"] > last_id:
+                return
+            change_time = record["change_time"] and datetime.fromisoformat(record["change_time"])
+            yield ArchivedVersion(
+                record["id"], event_id, record["changed_by"], change_time, record["version"]
+            ), record["data"]
+
+
+def _count_versions(db: Session, event_id: int, first_id: int, last_id: int, limit: int) -> int:
+    # Versions with first_id <= id <= last_id, counting no further than
+    # ``limit`` live rows, before any of them is loaded. Archived versions
+    # are counted from the catalog entries inside the range.
+    live = select(EventHistory.id).where(
+        EventHistory.event_id == event_id, EventHistory.id.between(first_id, last_id)
+    ).limit(limit).subquery()
+    archived = select(func.coalesce(func.sum(HistoryArchive.row_count), 0)).where(
+        HistoryArchive.event_id == event_id,
+        HistoryArchive.first_history_id >= first_id,
+        HistoryArchive.last_history_id <= last_id
+    ).scalar_subquery()
+    return db.execute(select(select(func.count()).select_from(live).scalar_subquery() + archived)).scalar()
+
+
+def diff_versions(db: Session, event_id: int, version1_id: int, version2_id: int,
+                  steps: bool = False) -> dict | None:
+    key = (event_id, version1_id, version2_id, steps)
+    cached = diff_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if steps:
+        first_id, last_id = min(version1_id, version2_id), max(version1_id, version2_id)
+        if _count_versions(db, event_id, first_id, last_id, MAX_DIFF_STEPS + 2) - 1 > MAX_DIFF_STEPS:
+            raise ValueError(f"Range spans more than {MAX_DIFF_STEPS} versions")
+        versions = load_range(db, event_id, first_id, last_id)
+    else:
+        versions = [v for v in (load_version(db, event_id, version1_id),
+                                load_version(db, event_id, version2_id)) if v]
+    by_id = {row.id: (row, data) for row, data in versions}
+    if version1_id not in by_id or version2_id not in by_id:
+        return None
+
+    v1, data1 = by_id[version1_id]
+    v2, data2 = by_id[version2_id]
+    result = {
+        "event_id": event_id,
+        "diff": diff_fields(data1, data2),
+        "version1_time": v1.change_time,
+        "version2_time": v2.change_time
+    }
+    if steps:
+        path = versions if version1_id <= version2_id else versions[::-1]
+        result["steps"] = [
+            {"from": a.id, "to": b.id, "diff": diff_fields(data_a, data_b)}
+            for (a, data_a), (b, data_b) in zip(path, path[1:])
+        ]
+    diff_cache.set(key, result)
+    return result
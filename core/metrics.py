@@ -0,0 +1,102 @@
+import threading
+from bisect import bisect_left
+
+# Seconds; tuned for DB checkouts and request latencies
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        cumulative, running = {}, 0
+        for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+            running += bucket_count
+            cumulative[str(bound)] = running
+        return {"buckets": cumulative, "count": count, "sum": total}
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self.value += amount
+
+
+class LabeledHistogram:
+    # One Histogram per combination of label values, created on first use
+    def __init__(self, label_names: tuple[str, ...], buckets=DEFAULT_BUCKETS):
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self.children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values) -> Histogram:
+        child = self.children.get(values)
+        if child is None:
+            with self._lock:
+                child = self.children.setdefault(values, Histogram(self.buckets))
+        return child
+
+
+class LabeledCounter:
+    def __init__(self, label_names: tuple[str, ...]):
+        self.label_names = label_names
+        self.children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values) -> Counter:
+        child = self.children.get(values)
+        if child is None:
+            with self._lock:
+                child = self.children.setdefault(values, Counter())
+        return child
+
+
+def _label_text(names, values, **extra) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def prometheus_text(name: str, help_text: str, metric) -> str:
+    # Prometheus text exposition (format 0.0.4) of one metric family
+    lines = [f"# HELP {name} {help_text}"]
+    if isinstance(metric, (Counter, LabeledCounter)):
+        lines.append(f"# TYPE {name} counter")
+        children = metric.children if isinstance(metric, LabeledCounter) else {(): metric}
+        names = getattr(metric, "label_names", ())
+        for values, counter in sorted(children.items()):
+            lines.append(f"{name}{_label_text(names, values)} {counter.value}")
+    else:
+        lines.append(f"# TYPE {name} histogram")
+        children = metric.children if isinstance(metric, LabeledHistogram) else {(): metric}
+        names = getattr(metric, "label_names", ())
+        for values, histogram in sorted(children.items()):
+            snapshot = histogram.snapshot()
+            for bound, count in snapshot["buckets"].items():
+                lines.append(f"{name}_bucket{_label_text(names, values, le=bound)} {count}")
+            lines.append(f"{name}_sum{_label_text(names, values)} {snapshot['sum']}")
+            lines.append(f"{name}_count{_label_text(names, values)} {snapshot['count']}")
+    return "\n".join(lines) + "\n"
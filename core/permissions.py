@@ -1,22 +1,91 @@
+from sqlalchemy import and_, literal, select, union_all
 from sqlalchemy.orm import Session
 from models.shared_access import SharedAccess
 from models.event import Event
 from models.user import User
 
 
+ACCESS_MEMO_KEY = "event_access"
+IN_CHUNK_SIZE = 500
+
+
 def get_user_event_role(user: User, event_id: int, db: Session) -> str | None:
-    # Owner check
-    event = db.query(Event).filter(Event.id == event_id).first()
-    if event and event.created_by == user.id:
-        return "owner"
+    return resolve_event_access(user, event_id, db)[1]
+
+
+def resolve_event_access(user: User, event_id: int, db: Session) -> tuple[Event | None, str | None]:
+    return resolve_events_access(user, [event_id], db)[event_id]
+
+
+def resolve_events_access(user: User, event_ids, db: Session) -> dict[int, tuple[Event | None, str | None]]:
+    # One joined query loads the event row together with the caller's share
+    # (if any). Results are memoized on the request's session so handlers
+    # can ask again without another round trip.
+    memo = db.info.setdefault(ACCESS_MEMO_KEY, {})
+    missing = list({i for i in event_ids if (user.id, i) not in memo})
+
+    for start in range(0, len(missing), IN_CHUNK_SIZE):
+        chunk = missing[start:start + IN_CHUNK_SIZE]
+        rows = db.execute(
+            select(Event, SharedAccess.role).outerjoin(
+                SharedAccess,
+                and_(SharedAccess.event_id == Event.id,
+                     SharedAccess.user_id == user.id)
+            ).where(Event.id.in_(chunk))
+        ).all()
+        for event, shared_role in rows:
+            role = "owner" if event.created_by == user.id else shared_role
+            memo[(user.id, event.id)] = (event, role)
+        for event_id in chunk:
+            memo.setdefault((user.id, event_id), (None, None))  # No access
+
+    return {i: memo[(user.id, i)] for i in event_ids}
+
+
+def forget_event_access(db: Session, event_id: int | None = None):
+    memo = db.info.get(ACCESS_MEMO_KEY)
+    if not memo:
+        return
+    if event_id is None:
+        memo.clear()
+        return
+    for key in [k for k in memo if k[1] == event_id]:
+        del memo[key]
+
+
+def accessible_event_ids(user_id: int):
+    # Ids of the events ``user_id`` owns or has been shared, for an IN
+    # filter; an id may appear twice. Both branches read covering indexes.
+    return union_all(
+        select(Event.id).where(Event.created_by == user_id),
+        select(SharedAccess.event_id).where(SharedAccess.user_id == user_id)
+    )
 
-    # Shared access check
-    shared = db.query(SharedAccess).filter(
-        SharedAccess.user_id == user.id,
-        SharedAccess.event_id == event_id
-    ).first()
 
-    if shared:
-        return shared.role
+def accessible_events(user_id: int, *criteria, role: str | None = None,
+                      order_by=None, limit: int | None = None):
+    # Owned and shared events as one subquery with an extra "role" column.
+    # Criteria go into each branch so the (created_by, timestamp) and
+    # (user_id, event_id) indexes stay usable; with a limit each branch is
+    # ordered and cut before the union.
+    owned = select(Event, literal("owner").label("role")).where(
+        Event.created_by == user_id, *criteria)
+    shared = select(Event, SharedAccess.role.label("role")).join(
+        SharedAccess, SharedAccess.event_id == Event.id
+    ).where(
+        SharedAccess.user_id == user_id,
+        Event.created_by != user_id,
+        *criteria
+    )
+    if role is not None:
+        shared = shared.where(SharedAccess.role == role)
 
-    return None  # No access
+    # Events shared with the "owner" role count as owned ones
+    branches = [shared] if role not in (None, "owner") else [owned, shared]
+    if limit is not None:
+        branches = [
+            select(b.order_by(*order_by).limit(limit).subquery()) for b in branches
+        ]
+    if len(branches) == 1:
+        return branches[0].subquery()
+    return union_all(*branches).subquery()
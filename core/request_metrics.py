@@ -0,0 +1,111 @@
+import logging
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+from core.config import settings
+from core.metrics import LabeledCounter, LabeledHistogram
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50, 100, 250)
+
+request_seconds = LabeledHistogram(("method", "route"))
+request_statements = LabeledHistogram(("method", "route"), STATEMENT_BUCKETS)
+request_db_seconds = LabeledHistogram(("method", "route"))
+requests_total = LabeledCounter(("method", "route", "status"))
+
+
+class RequestStats:
+    # SQL issued on behalf of one request. The object is shared by every
+    # copy of the request's context (threadpool, run_sync greenlets,
+    # streaming iterators), so statements anywhere in the request count.
+    __slots__ = ("statements", "db_seconds", "sql")
+
+    def __init__(self, capture_sql: bool = False):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.sql = [] if capture_sql else None
+
+
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = current_request.get()
+    if stats is None:
+        return
+    stats.statements += 1
+    stats.db_seconds += elapsed
+    if stats.sql is not None and len(stats.sql) < settings.SLOW_REQUEST_MAX_STATEMENTS:
+        stats.sql.append((elapsed, statement))
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def attach_query_hooks(engine):
+    # Registered on the Engine, so an AsyncEngine's sync_engine works too
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    return engine
+
+
+class RequestMetricsMiddleware:
+    # Pure ASGI rather than BaseHTTPMiddleware: streamed bodies are timed to
+    # their last chunk and no extra task is spawned per request. Requests
+    # are labelled with the route template, so /api/events/1 and
+    # /api/events/2 share one series.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats(capture_sql=settings.SLOW_REQUEST_MS is not None)
+        token = current_request.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            route = scope.get("route")
+            _record(scope["method"], route.path if route else "unmatched", status_code, elapsed, stats)
+            if settings.SLOW_REQUEST_MS is not None and elapsed * 1000 >= settings.SLOW_REQUEST_MS:
+                _log_slow(scope, status_code, elapsed, stats)
+
+
+def _record(method: str, route: str, status_code: int, elapsed: float, stats: RequestStats):
+    request_seconds.labels(method, route).observe(elapsed)
+    request_statements.labels(method, route).observe(stats.statements)
+    request_db_seconds.labels(method, route).observe(stats.db_seconds)
+    requests_total.labels(method, route, str(status_code)).inc()
+
+
+def _log_slow(scope, status_code: int, elapsed: float, stats: RequestStats):
+    lines = [f"  {seconds * 1000:8.2f} ms  {' '.join(sql.split())}" for seconds, sql in stats.sql]
+    if stats.statements > len(stats.sql):
+        lines.append(f"  ... {stats.statements - len(stats.sql)} more statements")
+    logger.warning(
+        "Slow request %s %s -> %s in %.1f ms, %d statements, %.1f ms in the database\n%s",
+        scope["method"], scope["path"], status_code, elapsed * 1000,
+        stats.statements, stats.db_seconds * 1000, "\n".join(lines))
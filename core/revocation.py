@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from core.config import settings
+from db.session import SessionLocal, upsert_insert
+from models.revoked_token import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+# Rows are re-read this far behind the newest revoked_at seen, to pick up
+# transactions that committed after a later one was already synced.
+SYNC_OVERLAP = timedelta(minutes=1)
+
+
+def _utc(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+class MemoryRevocationStore:
+    # Denylist of revoked keys -> expiry (epoch seconds). A revoked token
+    # stops being listed once it has expired, because decoding it fails
+    # from then on anyway; the check on every request is a dict lookup.
+    def __init__(self):
+        self.denied = {}
+
+    def is_revoked(self, key: str | None) -> bool:
+        return key in self.denied
+
+    def revoke(self, db: Session, key: str, expires_at: float) -> bool:
+        # True if the key was not revoked before
+        if key in self.denied:
+            return False
+        self.denied[key] = expires_at
+        return True
+
+    def prune(self):
+        now = time.time()
+        for key, expires_at in list(self.denied.items()):
+            if expires_at <= now:
+                self.denied.pop(key, None)
+
+    def sync(self):
+        self.prune()
+
+
+class SQLRevocationStore(MemoryRevocationStore):
+    # Revocations are written with the request's session (SQLite or
+    # PostgreSQL) and applied to this process's denylist at once; other
+    # processes pick them up on their next sync().
+    def __init__(self, session_factory):
+        super().__init__()
+        self.session_factory = session_factory
+        self.watermark = None
+
+    def revoke(self, db: Session, key: str, expires_at: float) -> bool:
+        inserted = db.execute(
+            upsert_insert(db, RevokedToken)
+            .values(key=key, expires_at=_utc(expires_at))
+            .on_conflict_do_nothing(index_elements=["key"])
+        ).rowcount
+        super().revoke(db, key, expires_at)
+        return inserted == 1
+
+    def sync(self):
+        now = _utc(time.time())
+        stmt = select(RevokedToken.key, RevokedToken.expires_at, RevokedToken.revoked_at).where(
+            RevokedToken.expires_at > now)
+        if self.watermark is not None:
+            stmt = stmt.where(RevokedToken.revoked_at >= self.watermark - SYNC_OVERLAP)
+
+        with self.session_factory() as db:
+            rows = db.execute(stmt).all()
+            db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+            db.commit()
+
+        for key, expires_at, revoked_at in rows:
+            self.denied[key] = expires_at.replace(tzinfo=timezone.utc).timestamp()
+            if self.watermark is None or revoked_at > self.watermark:
+                self.watermark = revoked_at
+        self.prune()
+
+
+revocation_store = (
+    SQLRevocationStore(SessionLocal) if settings.TOKEN_REVOCATION_BACKEND == "sql"
+    else MemoryRevocationStore()
+)
+
+
+def is_token_revoked(payload: dict) -> bool:
+    # Logging out revokes the whole login family, a refresh only its jti
+    return (revocation_store.is_revoked(payload.get("jti"))
+            or revocation_store.is_revoked(payload.get("fam")))
+
+
+_stop = threading.Event()
+
+
+def _sync_loop():
+    while not _stop.wait(settings.REVOCATION_SYNC_SECONDS):
+        try:
+            revocation_store.sync()
+        except Exception:
+            logger.exception("Token revocation sync failed")
+
+
+def start_sync():
+    revocation_store.sync()
+    _stop.clear()
+    threading.Thread(target=_sync_loop, name="revocation-sync", daemon=True).start()
+
+
+def stop_sync():
+    _stop.set()
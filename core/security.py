@@ -1,8 +1,9 @@
 from passlib.context import CryptContext
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from dotenv import load_dotenv
 import os
+import uuid
 from core.config import settings
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
@@ -13,26 +14,52 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes with a different cost than PASSWORD_HASH_ROUNDS are flagged by
+# verify_and_update, so changing the setting upgrades users as they log in.
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.PASSWORD_HASH_ROUNDS)
 
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update(plain_password, hashed_password) -> tuple[bool, str | None]:
+    # (valid, new_hash); new_hash is set when the stored hash should be replaced
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def get_password_hash(password):
     return pwd_context.hash(password)
 
 
-def create_access_token(data: dict):
+def _create_token(data: dict, token_type: str, expires_delta: timedelta, family: str | None) -> str:
+    # Every token gets its own ID (jti) for revocation and carries the ID of
+    # its login family (fam), shared by all tokens rotated from one login.
+    now = datetime.now(timezone.utc)
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({
+        "type": token_type,
+        "jti": uuid.uuid4().hex,
+        "fam": family or uuid.uuid4().hex,
+        "iat": now,
+        "exp": now + expires_delta,
+    })
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
 
-def create_refresh_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+def create_access_token(data: dict, family: str | None = None):
+    return _create_token(data, "access", timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES), family)
+
+
+def create_refresh_token(data: dict, family: str | None = None):
+    return _create_token(data, "refresh", timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS), family)
+
+
+def create_token_pair(username: str, family: str | None = None) -> dict:
+    family = family or uuid.uuid4().hex
+    return {
+        "access_token": create_access_token({"sub": username}, family),
+        "refresh_token": create_refresh_token({"sub": username}, family),
+        "token_type": "bearer"
+    }
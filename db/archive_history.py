@@ -0,0 +1,204 @@
+import json
+import logging
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, select, update
+from db.session import SessionLocal
+from core.config import settings
+from core.history import _reconstruct
+from core.permissions import IN_CHUNK_SIZE
+from models import user, event, shared_access  # noqa: F401 (register mappers)
+from models.event import Event
+from models.event_history import EventHistory
+from models.history_archive import HistoryArchive
+from utils.archive_segments import SegmentWriter
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PER_CHUNK = 100
+# Progress of an interrupted run, so the next one continues after it
+STATE_FILE = "archive_state.json"
+
+
+def _state_path() -> str:
+    return os.path.join(settings.HISTORY_ARCHIVE_DIR, STATE_FILE)
+
+
+def _load_state() -> int:
+    try:
+        with open(_state_path()) as f:
+            return json.load(f)["last_event_id"]
+    except (OSError, ValueError, KeyError):
+        return 0
+
+
+def _save_state(last_event_id: int):
+    os.makedirs(settings.HISTORY_ARCHIVE_DIR, exist_ok=True)
+    path = _state_path()
+    with open(path + ".tmp", "w") as f:
+        json.dump({"last_event_id": last_event_id}, f)
+    os.replace(path + ".tmp", path)
+
+
+def _candidate_events(db, after_event_id: int, cutoff: datetime) -> list[int]:
+    # Events with more versions than are retained, the oldest past the cutoff
+    return db.execute(
+        select(EventHistory.event_id)
+        .where(EventHistory.event_id > after_event_id)
+        .group_by(EventHistory.event_id)
+        .having(func.count() > settings.HISTORY_RETAIN_VERSIONS,
+                func.min(EventHistory.change_time) < cutoff)
+        .order_by(EventHistory.event_id)
+        .limit(EVENTS_PER_CHUNK)
+    ).scalars().all()
+
+
+def _split_event(db, event_id: int, cutoff: datetime):
+    # (rows to archive with their full data, oldest kept row and its data).
+    # Rows are read up to the oldest of the newest HISTORY_RETAIN_VERSIONS;
+    # the archived part is the prefix older than the cutoff.
+    boundary = db.execute(
+        select(EventHistory.id).where(EventHistory.event_id == event_id)
+        .order_by(EventHistory.id.desc())
+        .offset(settings.HISTORY_RETAIN_VERSIONS - 1).limit(1)
+    ).scalar()
+    if boundary is None:
+        return [], (None, None)
+    rows = db.execute(
+        select(EventHistory.id, EventHistory.version, EventHistory.changed_by,
+               EventHistory.change_time, EventHistory.is_delta, EventHistory.previous_data)
+        .where(EventHistory.event_id == event_id, EventHistory.id <= boundary)
+        .order_by(EventHistory.id)
+    ).all()
+    versions = _reconstruct(rows)
+    count = 0
+    while (count < len(versions) - 1 and versions[count][0].change_time is not None
+           and versions[count][0].change_time < cutoff):
+        count += 1
+    return versions[:count], versions[count]
+
+
+def _member(event_id: int, versions) -> bytes:
+    return "".join(json.dumps({
+        "id": row.id,
+        "event_id": event_id,
+        "version": row.version,
+        "changed_by": row.changed_by,
+        "change_time": row.change_time.isoformat() if row.change_time else None,
+        "data": data,
+    }) + "\n" for row, data in versions).encode()
+
+
+def archive_chunk(event_ids: list[int], cutoff: datetime, writer: SegmentWriter) -> int:
+    # Reads and writes the chunk's archive members outside any write
+    # transaction, then deletes the archived rows in one short one. A
+    # concurrent run that already archived some of them makes the deletes
+    # come up short; the transaction is rolled back and the members it
+    # wrote are simply never referenced.
+    entries, deleted_ids, checkpoints = [], [], []
+    with SessionLocal() as db:
+        for event_id in event_ids:
+            archived, (kept, kept_data) = _split_event(db, event_id, cutoff)
+            if not archived:
+                continue
+            segment, offset, length = writer.append(_member(event_id, archived))
+            entries.append({
+                "event_id": event_id, "segment": segment, "codec": writer.codec,
+                "byte_offset": offset, "byte_length": length, "row_count": len(archived),
+                "first_history_id": archived[0][0].id, "last_history_id": archived[-1][0].id,
+                "first_change_time": archived[0][0].change_time,
+                "last_change_time": archived[-1][0].change_time,
+            })
+            deleted_ids.extend(row.id for row, _ in archived)
+            # In delta mode the oldest row kept may build on archived rows
+            if kept.is_delta:
+                checkpoints.append((kept.id, json.dumps(kept_data)))
+    if not entries:
+        return 0
+    writer.sync()
+
+    with SessionLocal() as db:
+        deleted = 0
+        for start in range(0, len(deleted_ids), IN_CHUNK_SIZE):
+            deleted += db.execute(
+                delete(EventHistory).where(EventHistory.id.in_(deleted_ids[start:start + IN_CHUNK_SIZE]))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        if deleted != len(deleted_ids):
+            db.rollback()
+            logger.warning("History of events %s..%s changed while archiving, skipped",
+                           event_ids[0], event_ids[-1])
+            return 0
+        for history_id, data in checkpoints:
+            db.execute(update(EventHistory).where(EventHistory.id == history_id)
+                       .values(is_delta=False, previous_data=data))
+        db.execute(insert(HistoryArchive), entries)
+        # Archived versions leave the default history response: new ETags,
+        # through meta_version so edits in flight do not conflict
+        archived_events = [entry["event_id"] for entry in entries]
+        db.execute(update(Event).where(Event.id.in_(archived_events))
+                   .values(meta_version=Event.meta_version + 1)
+                   .execution_options(synchronize_session=False))
+        db.commit()
+    return len(deleted_ids)
+
+
+def archive_history(max_chunks: int | None = None, stop: threading.Event | None = None) -> int:
+    # Moves history rows outside the retention window into archive
+    # segments, EVENTS_PER_CHUNK events per transaction. Progress is saved
+    # after every chunk; a run that is stopped or crashes resumes from
+    # there, and a complete pass starts over from the first event.
+    if settings.HISTORY_RETAIN_VERSIONS < 1:
+        raise ValueError("HISTORY_RETAIN_VERSIONS must be at least 1")
+    cutoff = datetime.utcnow() - timedelta(days=settings.HISTORY_RETAIN_DAYS)
+    writer = SegmentWriter(settings.HISTORY_ARCHIVE_DIR, settings.HISTORY_ARCHIVE_COMPRESSION,
+                           settings.HISTORY_ARCHIVE_SEGMENT_BYTES)
+    last_event_id, archived, chunks = _load_state(), 0, 0
+    try:
+        while max_chunks is None or chunks < max_chunks:
+            if stop is not None and stop.is_set():
+                break
+            with SessionLocal() as db:
+                event_ids = _candidate_events(db, last_event_id, cutoff)
+            if not event_ids:
+                last_event_id = 0
+                break
+            archived += archive_chunk(event_ids, cutoff, writer)
+            last_event_id = event_ids[-1]
+            chunks += 1
+            _save_state(last_event_id)
+            logger.info("Archived history up to event %s (%s rows)", last_event_id, archived)
+    finally:
+        writer.close()
+        _save_state(last_event_id)
+    return archived
+
+
+_stop = threading.Event()
+
+
+def _archive_loop():
+    while not _stop.wait(settings.HISTORY_ARCHIVE_INTERVAL_SECONDS):
+        try:
+            archive_history(stop=_stop)
+        except Exception:
+            logger.exception("History archival failed")
+
+
+def start_background():
+    if settings.HISTORY_ARCHIVE_INTERVAL_SECONDS is None:
+        return
+    _stop.clear()
+    threading.Thread(target=_archive_loop, name="history-archive", daemon=True).start()
+
+
+def stop_background():
+    _stop.set()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    total = archive_history(int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    print(f"History archival done! ({total} rows archived)")
@@ -3,6 +3,8 @@ from models import user
 from models import event
 from models import shared_access
 from models import event_history
+from models import revoked_token
+from models import history_archive
 
 
 def init():
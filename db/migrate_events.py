@@ -0,0 +1,76 @@
+from sqlalchemy import bindparam, inspect, select, text, update
+from db.session import engine
+from models import user, shared_access, event_history  # noqa: F401 (register mappers)
+from models.event import Event
+from utils.intervals import span_bucket
+
+EVENTS_PER_BATCH = 1000
+
+# Columns added to events after its first release, with what follows the
+# column type in their ADD COLUMN
+ADDED_COLUMNS = {
+    "recurrence": "",
+    "end_time": "",
+    "span_bucket": "NOT NULL DEFAULT 0",
+    "version": "NOT NULL DEFAULT 1",
+    "meta_version": "NOT NULL DEFAULT 0",
+}
+
+
+def add_missing_columns() -> list[str]:
+    columns = {c["name"] for c in inspect(engine).get_columns("events")}
+    added = [name for name in ADDED_COLUMNS if name not in columns]
+    with engine.begin() as conn:
+        for name in added:
+            column_type = Event.__table__.c[name].type.compile(dialect=engine.dialect)
+            conn.execute(text(f"ALTER TABLE events ADD COLUMN {name} {column_type} {ADDED_COLUMNS[name]}"))
+    return added
+
+
+def add_missing_indexes():
+    # create_all skips tables that already exist, indexes included. An
+    # index declared with ddl_if(dialect=...) only exists on that dialect.
+    for index in Event.__table__.indexes:
+        ddl_if = getattr(index, "_ddl_if", None)
+        if ddl_if is not None and ddl_if.dialect not in (None, engine.dialect.name):
+            continue
+        index.create(bind=engine, checkfirst=True)
+
+
+def backfill_span_buckets() -> int:
+    # span_bucket defaults to 0, right for every event without an end time
+    last_id, total = 0, 0
+    stmt = update(Event.__table__).where(Event.id == bindparam("event_id")).values(
+        span_bucket=bindparam("bucket"))
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(Event.id, Event.timestamp, Event.end_time, Event.span_bucket)
+                .where(Event.id > last_id, Event.end_time.is_not(None))
+                .order_by(Event.id).limit(EVENTS_PER_BATCH)
+            ).all()
+            if not rows:
+                return total
+            changed = [
+                {"event_id": row.id, "bucket": span_bucket(row.timestamp, row.end_time)}
+                for row in rows if row.span_bucket != span_bucket(row.timestamp, row.end_time)
+            ]
+            if changed:
+                conn.execute(stmt, changed)
+            total += len(changed)
+            last_id = rows[-1].id
+
+
+def migrate():
+    # Brings an events table created by an earlier release up to the
+    # current model: columns, span buckets, then indexes. Safe to re-run.
+    added = add_missing_columns()
+    if added:
+        print(f"Added columns: {', '.join(added)}")
+    print(f"Span buckets updated: {backfill_span_buckets()}")
+    add_missing_indexes()
+    print("Events migration done!")
+
+
+if __name__ == "__main__":
+    migrate()
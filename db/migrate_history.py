@@ -0,0 +1,77 @@
+import json
+import sys
+from sqlalchemy import inspect, select, text, update
+from db.session import engine, SessionLocal
+from core.config import settings
+from models import user, event, shared_access  # noqa: F401 (register mappers)
+from models.event_history import EventHistory
+from utils.diff_utlis import apply_delta, field_delta
+
+EVENTS_PER_BATCH = 200
+
+
+def add_missing_columns():
+    columns = {c["name"] for c in inspect(engine).get_columns("event_history")}
+    with engine.begin() as conn:
+        if "version" not in columns:
+            conn.execute(text("ALTER TABLE event_history ADD COLUMN version INTEGER"))
+        if "is_delta" not in columns:
+            conn.execute(text(
+                "ALTER TABLE event_history ADD COLUMN is_delta BOOLEAN NOT NULL DEFAULT false"))
+
+
+def add_missing_indexes():
+    # create_all skips tables that already exist, indexes included
+    for index in EventHistory.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+
+def _rewrite_event(db, event_id: int, storage: str) -> int:
+    rows = db.query(EventHistory).filter(
+        EventHistory.event_id == event_id
+    ).order_by(EventHistory.id).all()
+
+    previous, changed = None, 0
+    for version, row in enumerate(rows, start=1):
+        stored = json.loads(row.previous_data)
+        data = apply_delta(previous, stored) if row.is_delta else stored
+
+        is_delta = (storage == "delta" and previous is not None
+                    and (version - 1) % settings.HISTORY_CHECKPOINT_INTERVAL != 0)
+        new_data = json.dumps(field_delta(previous, data) if is_delta else data)
+        if (row.version, row.is_delta, row.previous_data) != (version, is_delta, new_data):
+            db.execute(update(EventHistory).where(EventHistory.id == row.id).values(
+                version=version, is_delta=is_delta, previous_data=new_data))
+            changed += 1
+        previous = data
+    return changed
+
+
+def migrate(storage: str = settings.HISTORY_STORAGE):
+    # Renumbers versions and re-encodes every event's history for the given
+    # storage mode ("delta" or "snapshot"). One short transaction per batch
+    # of events; safe to re-run.
+    add_missing_columns()
+    add_missing_indexes()
+    last_event_id, total = 0, 0
+    while True:
+        with SessionLocal() as db:
+            event_ids = db.execute(
+                select(EventHistory.event_id)
+                .where(EventHistory.event_id > last_event_id)
+                .group_by(EventHistory.event_id)
+                .order_by(EventHistory.event_id)
+                .limit(EVENTS_PER_BATCH)
+            ).scalars().all()
+            if not event_ids:
+                break
+            for event_id in event_ids:
+                total += _rewrite_event(db, event_id, storage)
+            db.commit()
+            last_event_id = event_ids[-1]
+        print(f"Migrated history up to event {last_event_id} ({total} rows rewritten)")
+    print("History migration done!")
+
+
+if __name__ == "__main__":
+    migrate(sys.argv[1] if len(sys.argv) > 1 else settings.HISTORY_STORAGE)
@@ -0,0 +1,22 @@
+from sqlalchemy import text
+from db.session import engine
+from utils.search import SEARCH_DDL
+
+
+def migrate():
+    # Adds the full-text index to an existing database and fills it. On
+    # Postgres adding the generated column computes it for every row; the
+    # FTS5 table is rebuilt from the events table. Safe to re-run.
+    dialect = engine.dialect.name
+    if dialect not in SEARCH_DDL:
+        raise SystemExit(f"Full-text search is not supported on {dialect}")
+    with engine.begin() as conn:
+        for statement in SEARCH_DDL[dialect]:
+            conn.execute(text(statement))
+        if dialect == "sqlite":
+            conn.execute(text("INSERT INTO events_fts(events_fts) VALUES ('rebuild')"))
+    print("Search index ready!")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,102 @@
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from core.config import settings
+from core.metrics import Counter, Histogram
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.engine = None
+        self.checkout_wait = Histogram()
+        self.checkouts = Counter()
+        self.checkins = Counter()
+        self.timeouts = Counter()
+        self.connects = Counter()
+        self.closes = Counter()
+        self.invalidations = Counter()
+
+    def attach(self, engine):
+        # Pool events are registered on the engine so they also cover the
+        # pool created for an AsyncEngine's sync_engine.
+        self.engine = engine
+        event.listen(engine, "checkout", lambda *args: self.checkouts.inc())
+        event.listen(engine, "checkin", lambda *args: self.checkins.inc())
+        event.listen(engine, "connect", lambda *args: self.connects.inc())
+        event.listen(engine, "close", lambda *args: self.closes.inc())
+        event.listen(engine, "invalidate", lambda *args: self.invalidations.inc())
+        engine.pool.metrics = self
+        return self
+
+    def snapshot(self) -> dict:
+        pool = self.engine.pool
+        state = {}
+        if isinstance(pool, QueuePool):
+            state = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+            }
+        return {
+            "pool": type(pool).__name__,
+            **state,
+            "checkouts": self.checkouts.value,
+            "checkins": self.checkins.value,
+            "checkout_timeouts": self.timeouts.value,
+            "connections_opened": self.connects.value,
+            "connections_closed": self.closes.value,
+            "connections_invalidated": self.invalidations.value,
+            "checkout_wait_seconds": self.checkout_wait.snapshot(),
+        }
+
+
+class _TimedCheckout:
+    # Times Pool.connect(), i.e. how long a request waits for a connection
+    # including pre-ping. Pools copied by recreate() keep the same metrics.
+    metrics = None
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            if self.metrics:
+                self.metrics.timeouts.inc()
+            raise
+        finally:
+            if self.metrics:
+                self.metrics.checkout_wait.observe(time.perf_counter() - started)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncPool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url, is_async: bool = False) -> dict:
+    options = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite keeps its single-connection pool
+        return options
+    options.update(
+        poolclass=InstrumentedAsyncPool if is_async else InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    return options
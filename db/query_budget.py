@@ -0,0 +1,53 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from db import session
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+def _engines():
+    engines = [session.engine]
+    if session.async_engine is not None:
+        engines.append(session.async_engine.sync_engine)
+    return engines
+
+
+@contextmanager
+def count_queries(engines=None):
+    # Counts every statement sent to the app's engines, from any thread,
+    # while the block runs
+    counter = QueryCounter()
+    engines = engines or _engines()
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", counter._record)
+    try:
+        yield counter
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", counter._record)
+
+
+@contextmanager
+def query_budget(limit: int, label: str = "block", engines=None):
+    # Raises QueryBudgetExceeded, with the statements, when the block runs
+    # more than ``limit`` statements
+    with count_queries(engines) as counter:
+        yield counter
+    if counter.count > limit:
+        statements = "\n".join(f"  {i}. {' '.join(s.split())}" for i, s in enumerate(counter.statements, 1))
+        raise QueryBudgetExceeded(
+            f"{label} ran {counter.count} statements, budget is {limit}:\n{statements}")
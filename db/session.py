@@ -1,13 +1,100 @@
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from core.config import settings
+from core.request_metrics import attach_query_hooks
+from db.pool import PoolMetrics, engine_options
+import functools
+import inspect
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
 
 
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+pool_metrics = PoolMetrics().attach(engine)
+attach_query_hooks(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+# DB_MODE=async serves requests from an AsyncEngine (asyncpg / aiosqlite)
+# instead of running blocking handlers on Starlette's threadpool.
+ASYNC_MODE = settings.DB_MODE == "async"
+async_engine = None
+async_pool_metrics = None
+AsyncSessionLocal = None
+
+if ASYNC_MODE:
+    async_url = settings.ASYNC_DATABASE_URL or make_url(DATABASE_URL).set(
+        drivername=ASYNC_DRIVERS[make_url(DATABASE_URL).get_backend_name()])
+    async_engine = create_async_engine(
+        async_url, **engine_options(async_url, is_async=True))
+    async_pool_metrics = PoolMetrics().attach(async_engine.sync_engine)
+    attach_query_hooks(async_engine.sync_engine)
+    # Loaded rows are serialized after the session work finishes, so they
+    # must not expire on commit and lazy-load outside the greenlet.
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False)
+
+
+def get_sync_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+get_db = get_async_db if ASYNC_MODE else get_sync_db
+
+
+async def run_db(db, fn, *args, **kwargs):
+    # Run blocking ORM code against whichever session get_db produced.
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+def with_db_mode(fn):
+    # In async mode, turn a sync handler/dependency taking ``db`` into a
+    # coroutine that runs its body on the AsyncSession's sync facade. The
+    # signature (and therefore every Depends) is left untouched.
+    if not ASYNC_MODE or inspect.iscoroutinefunction(fn):
+        return fn
+    if "db" not in inspect.signature(fn).parameters:
+        return fn
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        db = kwargs.pop("db")
+        return await db.run_sync(lambda session: fn(*args, db=session, **kwargs))
+
+    return wrapper
+
+
+class DBRoute(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, with_db_mode(endpoint), **kwargs)
+
+
+def upsert_insert(db, entity):
+    # INSERT supporting ON CONFLICT for the session's dialect (PostgreSQL
+    # or SQLite; both take on_conflict_do_nothing/do_update)
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(entity)
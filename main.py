@@ -1,7 +1,19 @@
 from fastapi import FastAPI
 from routers import auth, event
 from routers import sharing
-app = FastAPI()
+from routers import internal
+from core.config import settings
+from core import hash_pool, revocation
+from core.request_metrics import RequestMetricsMiddleware
+from db import archive_history
+from utils.json_response import FastJSONResponse
+app = FastAPI(default_response_class=FastJSONResponse)
+app.add_event_handler("startup", revocation.start_sync)
+app.add_event_handler("shutdown", revocation.stop_sync)
+app.add_event_handler("shutdown", hash_pool.shutdown)
+app.add_event_handler("startup", archive_history.start_background)
+app.add_event_handler("shutdown", archive_history.stop_background)
+app.add_middleware(RequestMetricsMiddleware)
 
 app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
 
@@ -9,6 +21,9 @@ app.include_router(sharing.router, prefix="/api/events", tags=["Sharing"])
 app.include_router(event.router, prefix="/api/events", tags=["Events"])
 app.include_router(event.router, prefix="/api/events", tags=["Diff"])
 
+if settings.INTERNAL_ENDPOINTS_ENABLED:
+    app.include_router(internal.router, prefix="/internal", tags=["Internal"])
+
 
 @app.get("/")
 def root():
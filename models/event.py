@@ -1,6 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import DDL, Column, Integer, String, DateTime, ForeignKey, Index, JSON, SmallInteger, event, func, literal_column
 from sqlalchemy.orm import relationship
 from db.session import Base
+from utils.intervals import span_bucket
+from utils.search import SEARCH_DDL
 
 
 class Event(Base):
@@ -10,8 +12,51 @@ class Event(Base):
     title = Column(String, nullable=False)
     description = Column(String)
     timestamp = Column(DateTime, nullable=False)
+    end_time = Column(DateTime)  # NULL for point-in-time events
+    # Duration class from utils.intervals, kept in sync on every write
+    span_bucket = Column(SmallInteger, nullable=False, default=0, server_default="0")
     created_by = Column(Integer, ForeignKey("users.id"))
+    # schemas.event.RecurrenceRule as JSON; NULL for one-off events
+    recurrence = Column(JSON(none_as_null=True))
+    # Bumped on every edit of the event. As the mapper's version_id_col,
+    # every ORM UPDATE also checks it (compare-and-swap).
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Bumped when its shares change or its history is archived: plain
+    # UPDATEs that must not conflict with edits. The event, history and
+    # changelog ETags are built from both counters.
+    meta_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     creator = relationship("User", back_populates="events")
     shared_with = relationship("SharedAccess", back_populates="event")
     history = relationship("EventHistory", back_populates="event")
+
+    __table_args__ = (
+        Index("ix_events_created_by_timestamp", "created_by", "timestamp", "id"),
+        # Overlap queries: a range index on Postgres, duration buckets elsewhere
+        Index(
+            "ix_events_period",
+            func.tsrange(timestamp, func.coalesce(end_time, timestamp), literal_column("'[]'")),
+            postgresql_using="gist",
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_events_created_by_span", "created_by", "span_bucket", "timestamp"
+        ).ddl_if(dialect="sqlite"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+
+@event.listens_for(Event, "before_insert")
+@event.listens_for(Event, "before_update")
+def _set_span_bucket(mapper, connection, target):
+    target.span_bucket = span_bucket(target.timestamp, target.end_time)
+
+
+# Full-text search: a generated tsvector column with a GIN index on
+# Postgres, an external-content FTS5 table kept in sync by triggers on
+# SQLite. Every write path updates them, bulk statements included.
+for _dialect, _statements in SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Event.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+# Dropping events takes its triggers along but not the FTS5 table
+event.listen(Event.__table__, "before_drop",
+             DDL("DROP TABLE IF EXISTS events_fts").execute_if(dialect="sqlite"))
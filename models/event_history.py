@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, Text, Boolean, false
 from sqlalchemy.orm import relationship
 from db.session import Base
 from datetime import datetime
@@ -11,7 +11,17 @@ class EventHistory(Base):
     event_id = Column(Integer, ForeignKey("events.id"))
     changed_by = Column(Integer, ForeignKey("users.id"))
     change_time = Column(DateTime, default=datetime.utcnow)
+    # Per-event sequence number, 1 for the first recorded change
+    version = Column(Integer)
+    # previous_data holds either a full snapshot (a checkpoint) or, when
+    # is_delta is set, only the fields that changed since the prior row
+    is_delta = Column(Boolean, nullable=False, default=False, server_default=false())
     previous_data = Column(Text)
 
     event = relationship("Event", back_populates="history")
     user = relationship("User")
+
+    __table_args__ = (
+        # Keyset pages of one event's history, ordered by (change_time, id)
+        Index("ix_event_history_event_time", "event_id", "change_time", "id"),
+    )
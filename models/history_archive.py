@@ -0,0 +1,27 @@
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, func
+from db.session import Base
+
+
+class HistoryArchive(Base):
+    # Catalog of archived event_history rows: one entry per event and
+    # archive run, pointing at a compressed member of a segment file under
+    # HISTORY_ARCHIVE_DIR that holds the rows as NDJSON, oldest first.
+    __tablename__ = "history_archive"
+
+    id = Column(Integer, primary_key=True)
+    # No foreign key: entries outlive the event, like its history rows do
+    event_id = Column(Integer, nullable=False)
+    segment = Column(String, nullable=False)
+    codec = Column(String, nullable=False)
+    byte_offset = Column(BigInteger, nullable=False)
+    byte_length = Column(Integer, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    first_history_id = Column(Integer, nullable=False)
+    last_history_id = Column(Integer, nullable=False)
+    first_change_time = Column(DateTime)
+    last_change_time = Column(DateTime)
+    archived_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_history_archive_event", "event_id", "first_history_id"),
+    )
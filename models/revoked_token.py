@@ -0,0 +1,13 @@
+from sqlalchemy import Column, DateTime, String, func
+from db.session import Base
+
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    # A token "jti" or a login family "fam" (every token issued by one
+    # login and its refreshes); both are random hex IDs.
+    key = Column(String, primary_key=True)
+    expires_at = Column(DateTime, nullable=False, index=True)  # UTC, pruned after
+    # Set by the database; other processes sync rows by this watermark
+    revoked_at = Column(DateTime, nullable=False, server_default=func.now(), index=True)
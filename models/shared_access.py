@@ -14,6 +14,8 @@ class SharedAccess(Base):
     user = relationship("User", back_populates="shared_events")
     event = relationship("Event", back_populates="shared_with")
 
+    # The unique constraint doubles as the (user_id, event_id) index used
+    # to look up everything shared with a user.
     __table_args__ = (
         UniqueConstraint("user_id", "event_id", name="user_event_unique"),
     )
@@ -1,46 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from db.session import SessionLocal
+from db.session import DBRoute, get_db, run_db
 from schemas.user import UserCreate, UserOut
 from models.user import User
-from passlib.context import CryptContext
-from core.security import get_password_hash
 from fastapi.security import OAuth2PasswordRequestForm
-from core.security import verify_password, create_access_token
+from core.hash_pool import hash_password, verify_password
+from core.security import REFRESH_TOKEN_EXPIRE_DAYS, create_token_pair
+from core.auth import decode_token
+from core.revocation import revocation_store
 from datetime import timedelta
-from core.config import settings
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from core.security import create_refresh_token
+from jose import JWTError
+import time
 
-router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+router = APIRouter(route_class=DBRoute)
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-def get_password_hash(password: str):
-    return pwd_context.hash(password)
-
-
-@router.post("/register", response_model=UserOut)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+def _check_available(db: Session, user: UserCreate):
     if db.query(User).filter(User.email == user.email).first():
         raise HTTPException(
-            status_code=400, message="Email already registered")
+            status_code=400, detail="Email already registered")
     if db.query(User).filter(User.username == user.username).first():
-        raise HTTPException(status_code=400, message="Username already taken")
+        raise HTTPException(status_code=400, detail="Username already taken")
+
 
+def _create_user(db: Session, user: UserCreate, hashed_password: str) -> User:
     new_user = User(
         username=user.username,
         email=user.email,
-        hashed_password=get_password_hash(user.password),
+        hashed_password=hashed_password,
         role=user.role
     )
 
@@ -50,43 +38,87 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     return new_user
 
 
+# Register and login are async so bcrypt can be awaited on the hash pool;
+# their DB work still goes through run_db.
+@router.post("/register", response_model=UserOut)
+async def register(user: UserCreate, db: Session = Depends(get_db)):
+    await run_db(db, _check_available, user)
+    hashed_password = await hash_password(user.password)
+    return await run_db(db, _create_user, user, hashed_password)
+
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 
-@router.post("/refresh")
-def refresh_token(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY,
-                             algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
+def _revoke_family(db: Session, payload: dict):
+    # No token of the family can be minted after this, so the entry can go
+    # once the longest-lived one would have expired
+    expires_at = time.time() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS).total_seconds()
+    revocation_store.revoke(db, payload["fam"], expires_at)
 
-        # issue new access token
-        new_token = create_access_token(data={"sub": username})
-        return {"access_token": new_token, "token_type": "bearer"}
 
+@router.post("/refresh")
+def refresh_token(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    # Rotation: the presented refresh token is revoked and a new pair from
+    # the same family is issued. Presenting an already rotated token means
+    # it leaked, so the whole family is revoked.
+    try:
+        payload = decode_token(token)
     except JWTError:
         raise HTTPException(status_code=401, detail="Could not refresh token")
+    if payload.get("type") != "refresh" or not payload.get("sub"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if revocation_store.is_revoked(payload["fam"]):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+
+    if not revocation_store.revoke(db, payload["jti"], payload["exp"]):
+        _revoke_family(db, payload)
+        db.commit()
+        raise HTTPException(status_code=401, detail="Refresh token already used")
+
+    tokens = create_token_pair(payload["sub"], family=payload["fam"])
+    db.commit()
+    return tokens
+
+
+def _find_user(db: Session, username: str) -> User | None:
+    return db.query(User).filter(User.username == username).first()
+
+
+def _update_password_hash(db: Session, user: User, hashed_password: str):
+    user.hashed_password = hashed_password
+    db.commit()
 
 
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
-        raise HTTPException(status_code=401, message="Invalid credentials")
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await run_db(db, _find_user, form_data.username)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    valid, new_hash = await verify_password(form_data.password, user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    access_token = create_access_token(data={"sub": user.username})
+    # Each login starts a new token family
+    tokens = create_token_pair(user.username)
 
-    refresh_token = create_refresh_token(data={"sub": user.username})  # new
+    if new_hash:
+        # Stored with a different cost than PASSWORD_HASH_ROUNDS
+        await run_db(db, _update_password_hash, user, new_hash)
 
-    return {
-        "access_token": access_token,
-        "refresh_token": refresh_token,
-        "token_type": "bearer"
-    }
+    return tokens
 
 
 @router.post("/logout")
-def logout():
+def logout(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    # Revokes every access and refresh token issued from this login
+    try:
+        payload = decode_token(token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Could not validate token")
+    if not payload.get("fam"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    _revoke_family(db, payload)
+    db.commit()
     return {"message": "Logged out successfully"}
@@ -1,116 +1,691 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from db.session import SessionLocal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import and_, delete, insert, null, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.orm.exc import StaleDataError
+from db.session import DBRoute, SessionLocal, get_db, run_db
 from models.event import Event
-from schemas.event import EventCreate, EventOut, EventUpdate, EventBatchCreate
+from schemas.event import (
+    EventCreate, EventOut, EventUpdate, EventBatchCreate, EventBatchDelete, EventBatchUpdate,
+    ExportFormat, OccurrenceOut
+)
 from core.auth import get_current_user
 from models.user import User
-from core.permissions import get_user_event_role
+from core.permissions import (
+    IN_CHUNK_SIZE, accessible_event_ids, accessible_events, forget_event_access,
+    get_user_event_role, resolve_event_access, resolve_events_access
+)
+from models.shared_access import SharedAccess
 from models.event_history import EventHistory
+from core.history import (
+    diff_versions, load_history_page, load_version, record_history, restore_snapshot, snapshot_event
+)
+from utils.diff_utlis import diff_fields
+from utils.etag import edit_matches, etag_matches, event_etag
+from utils.json_response import FastJSONResponse
+from schemas.shared_access import Role
+from utils.export import EXPORT_BATCH_SIZE, MEDIA_TYPES, stream_query
+from utils.intervals import overlap_criteria, overlapping_pairs, span_bucket
+from utils.recurrence import expand, to_naive_utc
+from utils.search import match_events, search_terms
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor
+from datetime import datetime, timedelta
+from itertools import chain, islice
+from operator import itemgetter
+import heapq
 import json
+import orjson
 
-router = APIRouter()
+router = APIRouter(route_class=DBRoute)
 
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+BULK_CHUNK_SIZE = 1000
+MAX_IMPORT_LINE_BYTES = 1024 * 1024
+MAX_CHUNK_ERRORS = 20
+MAX_CONFLICT_USERS = 50
+# NDJSON lines per chunk streamed by GET /conflicts
+CONFLICT_CHUNK_SIZE = 10_000
+BATCH_RETRIES = 3
+EVENT_OUT_FIELDS = tuple(EventOut.__fields__)
 
 
 @router.post("/", response_model=EventOut)
 def create_event(
     event: EventCreate,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    new_event = Event(
-        title=event.title,
-        description=event.description,
-        timestamp=event.timestamp,
-        created_by=current_user.id
-    )
+    new_event = Event(**event_values(event), created_by=current_user.id)
     db.add(new_event)
     db.commit()
     db.refresh(new_event)
+    response.headers["ETag"] = event_etag(new_event.id, new_event.version, new_event.meta_version)
     return new_event
 
 
+def event_dict(event) -> dict:
+    # EventOut's fields read off an Event or a result row. Stored values
+    # were validated on the way in, so list endpoints skip EventOut per row.
+    return {field: getattr(event, field) for field in EVENT_OUT_FIELDS}
+
+
+def event_values(event: EventCreate | EventUpdate, **kwargs) -> dict:
+    # Column values from a create/update payload; the recurrence rule is
+    # stored as plain JSON.
+    values = event.dict(exclude={"duration_minutes", "id", "version"}, **kwargs)
+    if "recurrence" in values:
+        values["recurrence"] = json.loads(event.recurrence.json()) if event.recurrence else None
+    return values
+
+
+def insert_events(db: Session, user_id: int, events: list[EventCreate]) -> list[dict]:
+    # Multi-row INSERT ... RETURNING per chunk; the response is built from
+    # the returned rows, so nothing is refreshed afterwards. A Core insert on
+    # the table: the ORM's bulk insert would split the chunk wherever the
+    # set of non-NULL columns changes. SQLite has no sentinel to order
+    # RETURNING rows by, which makes SQLAlchemy insert row by row; its rowids
+    # follow the VALUES order, so the rows are sorted by id instead.
+    by_id = db.get_bind().dialect.name == "sqlite"
+    stmt = insert(Event.__table__).returning(
+        Event.id, Event.title, Event.description, Event.timestamp, Event.end_time,
+        Event.recurrence, Event.created_by, Event.version, sort_by_parameter_order=not by_id
+    )
+    created = []
+    for start in range(0, len(events), BULK_CHUNK_SIZE):
+        rows = [dict(row._mapping) for row in db.execute(stmt, [
+            {**event_values(e), "created_by": user_id,
+             "span_bucket": span_bucket(e.timestamp, e.end_time)}
+            for e in events[start:start + BULK_CHUNK_SIZE]
+        ])]
+        created.extend(sorted(rows, key=lambda row: row["id"]) if by_id else rows)
+    return created
+
+
 @router.post("/batch", response_model=list[EventOut])
 def create_multiple_events(
     batch: EventBatchCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    new_events = [
-        Event(
-            title=e.title,
-            description=e.description,
-            timestamp=e.timestamp,
-            created_by=current_user.id
-        ) for e in batch.events
-    ]
-    db.add_all(new_events)
+    created = insert_events(db, current_user.id, batch.events)
     db.commit()
-    return [EventOut.from_orm(e) for e in new_events]
+    # One ETag describes one event, so it is only sent for a batch of one;
+    # a new row's meta_version is always the column default 0
+    headers = None
+    if len(created) == 1:
+        headers = {"ETag": event_etag(created[0]["id"], created[0]["version"])}
+    return FastJSONResponse(created, headers=headers)
+
+
+def _update_values(event: Event, updates: EventUpdate) -> dict:
+    # Attribute values an update sets on ``event``; raises ValueError when
+    # the resulting period would be invalid, before anything is changed.
+    values = event_values(updates, exclude_unset=True)
+    timestamp = values.get("timestamp", event.timestamp)
+    if updates.duration_minutes is not None:
+        values["end_time"] = timestamp + timedelta(minutes=updates.duration_minutes)
+    end_time = values.get("end_time", event.end_time)
+    if end_time is not None and end_time < timestamp:
+        raise ValueError("end_time must not be before timestamp")
+    return values
+
+
+def _batch_error(id: int, status_code: int, detail) -> dict:
+    return {"id": id, "status": status_code, "detail": detail}
+
+
+def _apply_batch_update(db: Session, user: User, batch: EventBatchUpdate) -> list[dict]:
+    ids = [item.id for item in batch.events]
+    access = resolve_events_access(user, ids, db)
+
+    results, changes, seen = {}, [], set()
+    for index, item in enumerate(batch.events):
+        event, role = access[item.id]
+        if item.id in seen:
+            results[index] = _batch_error(item.id, 400, "Duplicate id in batch")
+        elif event is None:
+            results[index] = _batch_error(item.id, 404, "Event not found")
+        elif role not in ["owner", "editor"]:
+            results[index] = _batch_error(item.id, 403, "No edit access")
+        elif item.version is not None and item.version != event.version:
+            results[index] = _batch_error(item.id, 409, {
+                "message": "Event was modified by another request",
+                "current": event_dict(event)})
+        else:
+            try:
+                changes.append((index, event, _update_values(event, item)))
+            except ValueError as exc:
+                results[index] = _batch_error(item.id, 400, str(exc))
+        seen.add(item.id)
+
+    # Previous states of every event in one multi-row insert, then one
+    # compare-and-swap UPDATE per event, all flushed together
+    record_history(db, [event for _, event, _ in changes], user.id)
+    for _, event, values in changes:
+        for field, value in values.items():
+            setattr(event, field, value)
+        event.version = Event.version + 1
+    db.flush()
+
+    for index, event, _ in changes:
+        results[index] = {"id": event.id, "status": 200, "event": event_dict(event)}
+    return [results[index] for index in range(len(batch.events))]
+
+
+@router.put("/batch")
+def update_multiple_events(
+    batch: EventBatchUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Applies every valid item in one transaction and reports each item's
+    # outcome in request order. A concurrent write to one of the events
+    # rolls the transaction back; the batch is then re-read and retried.
+    for _ in range(BATCH_RETRIES):
+        try:
+            results = _apply_batch_update(db, current_user, batch)
+            db.commit()
+        except StaleDataError:
+            db.rollback()
+            forget_event_access(db)
+            continue
+        return FastJSONResponse({
+            "updated": sum(r["status"] == 200 for r in results),
+            "failed": sum(r["status"] != 200 for r in results),
+            "results": results
+        })
+    raise HTTPException(status_code=409, detail="Events kept changing concurrently, retry the batch")
+
+
+@router.post("/batch/delete")
+def delete_multiple_events(
+    batch: EventBatchDelete,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    access = resolve_events_access(current_user, batch.ids, db)
+    results, deletable, seen = [], [], set()
+    for id in batch.ids:
+        event, role = access[id]
+        if id in seen:
+            results.append(_batch_error(id, 400, "Duplicate id in batch"))
+        elif event is None:
+            results.append(_batch_error(id, 404, "Event not found"))
+        elif role != "owner":
+            results.append(_batch_error(id, 403, "Only owners can delete"))
+        else:
+            results.append({"id": id, "status": 204})
+            deletable.append(id)
+        seen.add(id)
+
+    # Same effect as deleting each event through the ORM: history and
+    # share rows are detached, not removed
+    for start in range(0, len(deletable), IN_CHUNK_SIZE):
+        chunk = deletable[start:start + IN_CHUNK_SIZE]
+        for model in (EventHistory, SharedAccess):
+            db.execute(update(model).where(model.event_id.in_(chunk)).values(event_id=None)
+                       .execution_options(synchronize_session=False))
+        db.execute(delete(Event).where(Event.id.in_(chunk))
+                   .execution_options(synchronize_session=False))
+    db.commit()
+    forget_event_access(db)
+    return {
+        "deleted": len(deletable),
+        "failed": sum(r["status"] != 204 for r in results),
+        "results": results
+    }
+
+
+def _import_chunk(db: Session, user_id: int, events: list[EventCreate]) -> str | None:
+    try:
+        insert_events(db, user_id, events)
+        db.commit()
+    except SQLAlchemyError as exc:
+        db.rollback()
+        return str(exc.__cause__ or exc)
+    return None
+
+
+async def _ndjson_lines(stream):
+    buffer = b""
+    async for data in stream:
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+        if len(buffer) > MAX_IMPORT_LINE_BYTES:
+            raise HTTPException(status_code=413, detail="NDJSON line too long")
+    if buffer:
+        yield buffer
+
+
+@router.post("/import")
+async def import_events(
+    request: Request,
+    chunk_size: int = Query(BULK_CHUNK_SIZE, ge=1, le=10 * BULK_CHUNK_SIZE),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Body is NDJSON, one EventCreate per line. It is read incrementally and
+    # committed chunk by chunk, so a failing chunk doesn't undo earlier ones.
+    chunks = []
+    pending, errors = [], []
+    line_no = first_line = 0
+
+    async def flush():
+        error = await run_db(db, _import_chunk, current_user.id, pending) if pending else None
+        chunks.append({
+            "chunk": len(chunks) + 1,
+            "lines": [first_line, line_no],
+            "imported": 0 if error else len(pending),
+            "failed": len(errors) + (len(pending) if error else 0),
+            "errors": errors[:MAX_CHUNK_ERRORS] + ([{"error": error}] if error else []),
+        })
+
+    async for line in _ndjson_lines(request.stream()):
+        line_no += 1
+        if not first_line:
+            first_line = line_no
+        if not line.strip():
+            continue
+        try:
+            pending.append(EventCreate.parse_raw(line))
+        except ValidationError as exc:
+            errors.append({"line": line_no, "error": [
+                {"loc": e["loc"], "msg": e["msg"]} for e in exc.errors()
+            ]})
+        if len(pending) + len(errors) >= chunk_size:
+            await flush()
+            pending, errors, first_line = [], [], 0
+
+    if pending or errors:
+        await flush()
+
+    return {
+        "imported": sum(c["imported"] for c in chunks),
+        "failed": sum(c["failed"] for c in chunks),
+        "chunks": chunks
+    }
 
 
 @router.get("/", response_model=list[EventOut])
 def get_events(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    role: Role | None = None,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    criteria = []
+    if start is not None:
+        criteria.append(Event.timestamp >= start)
+    if end is not None:
+        criteria.append(Event.timestamp < end)
+    return _event_page(db, current_user, criteria, cursor, limit,
+                       role=role.value if role else None)
+
+
+def _event_page(db: Session, user: User, criteria: list, cursor: str | None,
+                limit: int, role: str | None = None) -> Response:
+    # One keyset page, ordered by (timestamp, id), of the accessible events
+    # matching ``criteria``; sets X-Next-Cursor when more rows follow. Rows
+    # are read as plain columns and encoded by orjson as they are.
+    if cursor:
+        after_ts, after_id = decode_cursor(cursor)
+        criteria = [*criteria, or_(
+            Event.timestamp > after_ts,
+            and_(Event.timestamp == after_ts, Event.id > after_id)
+        )]
+
+    # Fetch one extra row to know whether another page exists
+    subq = accessible_events(
+        user.id, *criteria,
+        role=role,
+        order_by=(Event.timestamp, Event.id),
+        limit=limit + 1
+    )
+    page = aliased(Event, subq)
+    rows = db.execute(
+        select(*(getattr(page, field) for field in EVENT_OUT_FIELDS))
+        .order_by(page.timestamp, page.id).limit(limit + 1)
+    ).all()
+    events = [dict(zip(EVENT_OUT_FIELDS, row)) for row in rows[:limit]]
+
+    headers = {}
+    if len(rows) > limit:
+        headers["X-Next-Cursor"] = encode_cursor(events[-1]["timestamp"], events[-1]["id"])
+    return FastJSONResponse(events, headers=headers)
+
+
+@router.get("/window", response_model=list[EventOut])
+def get_events_in_window(
+    start: datetime,
+    end: datetime,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    events = db.query(Event).filter(Event.created_by == current_user.id).all()
-    return events
+    # Stored events whose [timestamp, end_time) overlaps [start, end)
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    criteria = overlap_criteria(Event, start, end, db.get_bind().dialect.name)
+    return _event_page(db, current_user, criteria, cursor, limit)
+
+
+@router.get("/search")
+def search_events(
+    q: str = Query(..., min_length=1, max_length=200),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Accessible events whose title or description contains every word of
+    # ``q``, best match first. The full-text index is restricted to the
+    # caller's events before anything is ranked; ranked pages are addressed
+    # by offset (X-Next-Offset).
+    terms = search_terms(q)
+    if not terms:
+        return FastJSONResponse([])
+
+    matches = match_events(
+        terms, db.get_bind().dialect.name, accessible_event_ids(current_user.id))
+    rows = db.execute(
+        select(*(getattr(Event, field) for field in EVENT_OUT_FIELDS), matches.c.rank)
+        .join_from(matches, Event, Event.id == matches.c.id)
+        .order_by(matches.c.rank.desc(), Event.timestamp, Event.id)
+        .offset(offset).limit(limit + 1)
+    ).all()
+    results = [dict(zip((*EVENT_OUT_FIELDS, "rank"), row)) for row in rows[:limit]]
+
+    headers = {}
+    if len(rows) > limit:
+        headers["X-Next-Offset"] = str(offset + limit)
+    return FastJSONResponse(results, headers=headers)
+
+
+def _series(event: Event, start: datetime, end: datetime):
+    duration = event.end_time - event.timestamp if event.end_time else timedelta(0)
+    for occurrence_start, original, override in expand(
+            event.timestamp, event.recurrence, start, end, duration):
+        yield occurrence_start, original, override, event
+
+
+@router.get("/occurrences", response_model=list[OccurrenceOut])
+def get_occurrences(
+    start: datetime,
+    end: datetime,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=10 * MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Occurrences of owned and shared events in [start, end). Recurring
+    # series are expanded lazily inside the window only.
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    dialect = db.get_bind().dialect.name
+    subq = accessible_events(current_user.id, or_(
+        and_(Event.recurrence.is_(None), *overlap_criteria(Event, start, end, dialect)),
+        and_(Event.recurrence.is_not(None), Event.timestamp < end)
+    ))
+    window = aliased(Event, subq)
+    events = db.execute(select(window).order_by(window.timestamp, window.id)).scalars().all()
+
+    streams = [[(e.timestamp, None, None, e) for e in events if not e.recurrence]]
+    streams += [_series(e, start, end) for e in events if e.recurrence]
+
+    occurrences = []
+    for occurrence_start, original, override, event in islice(
+            heapq.merge(*streams, key=lambda o: o[0]), limit):
+        override = override or {}
+        occurrences.append({
+            "event_id": event.id,
+            "title": override.get("title") or event.title,
+            "description": override.get("description") or event.description,
+            "timestamp": occurrence_start,
+            "end_time": occurrence_start + (event.end_time - event.timestamp) if event.end_time else None,
+            "occurrence": original
+        })
+    return FastJSONResponse(occurrences)
+
+
+def _occurrence_intervals(db: Session, user_id: int, start: datetime, end: datetime):
+    # (start, end, event_id, title, occurrence) for every occurrence of the
+    # user's owned and shared events overlapping [start, end), by start.
+    # One-off events are read as plain rows through a server-side cursor in
+    # index order; recurring series are loaded up front and expanded inside
+    # the window.
+    dialect = db.get_bind().dialect.name
+    series = aliased(Event, accessible_events(
+        user_id, Event.recurrence.is_not(None), Event.timestamp < end))
+    one_off = accessible_events(
+        user_id, Event.recurrence.is_(None), *overlap_criteria(Event, start, end, dialect))
+
+    expanded = [_series_intervals(row, start, end) for row in db.execute(select(
+        series.id, series.title, series.timestamp, series.end_time, series.recurrence
+    )).all()]
+    # On the connection, so rows skip the ORM's result processing and go
+    # to the sweep as they are
+    rows = db.connection().execute(
+        select(one_off.c.timestamp, one_off.c.end_time, one_off.c.id, one_off.c.title, null())
+        .order_by(one_off.c.timestamp, one_off.c.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    intervals = chain.from_iterable(rows.partitions())
+    if not expanded:
+        return intervals
+    return heapq.merge(intervals, *expanded, key=itemgetter(0))
+
+
+def _series_intervals(event, start: datetime, end: datetime):
+    for occurrence_start, original, override, _ in _series(event, start, end):
+        yield (
+            occurrence_start,
+            occurrence_start + (event.end_time - event.timestamp) if event.end_time else None,
+            event.id,
+            (override or {}).get("title") or event.title,
+            original
+        )
+
+
+def _conflict_lines(user_ids: list[int], start: datetime, end: datetime):
+    db = SessionLocal()
+    try:
+        for user_id in user_ids:
+            lines = []
+            for first, second, overlap_start, overlap_end in overlapping_pairs(
+                    _occurrence_intervals(db, user_id, start, end)):
+                lines.append(orjson.dumps({
+                    "user_id": user_id,
+                    "first": {"event_id": first[2], "title": first[3], "occurrence": first[4]},
+                    "second": {"event_id": second[2], "title": second[3], "occurrence": second[4]},
+                    "start": overlap_start,
+                    "end": overlap_end
+                }, option=orjson.OPT_APPEND_NEWLINE))
+                if len(lines) >= CONFLICT_CHUNK_SIZE:
+                    yield b"".join(lines)
+                    lines = []
+            if lines:
+                yield b"".join(lines)
+    finally:
+        db.close()
+
+
+@router.get("/conflicts")
+def get_conflicts(
+    start: datetime,
+    end: datetime,
+    user_ids: list[int] = Query([]),
+    current_user: User = Depends(get_current_user)
+):
+    # Streams every pair of overlapping occurrences in [start, end) as NDJSON,
+    # per user, across owned and shared events. Other users' calendars are
+    # only visible to admins.
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    user_ids = list(dict.fromkeys(user_ids)) or [current_user.id]
+    if len(user_ids) > MAX_CONFLICT_USERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CONFLICT_USERS} users per request")
+    if current_user.role != "admin" and user_ids != [current_user.id]:
+        raise HTTPException(status_code=403, detail="Only admins can check other users")
+
+    return StreamingResponse(
+        _conflict_lines(user_ids, start, end), media_type=MEDIA_TYPES["ndjson"])
+
+
+def _export_response(stmt, name: str, format: ExportFormat, compress: bool):
+    filename = f"{name}.{format.value}" + (".gz" if compress else "")
+    return StreamingResponse(
+        stream_query(SessionLocal, stmt, format.value, compress),
+        media_type="application/gzip" if compress else MEDIA_TYPES[format.value],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/export")
+def export_events(
+    format: ExportFormat = ExportFormat.ndjson,
+    compress: bool = False,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    current_user: User = Depends(get_current_user)
+):
+    criteria = []
+    if start is not None:
+        criteria.append(Event.timestamp >= start)
+    if end is not None:
+        criteria.append(Event.timestamp < end)
+
+    events = accessible_events(current_user.id, *criteria)
+    stmt = select(
+        events.c.id, events.c.title, events.c.description, events.c.timestamp,
+        events.c.end_time, events.c.recurrence, events.c.created_by, events.c.role
+    ).order_by(events.c.timestamp, events.c.id)
+    return _export_response(stmt, "events", format, compress)
+
+
+@router.get("/export/history")
+def export_event_history(
+    format: ExportFormat = ExportFormat.ndjson,
+    compress: bool = False,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    current_user: User = Depends(get_current_user)
+):
+    # start/end filter on change_time so incremental exports only read new rows
+    events = accessible_events(current_user.id)
+    stmt = select(
+        EventHistory.id, EventHistory.event_id, EventHistory.changed_by,
+        EventHistory.change_time, EventHistory.version, EventHistory.is_delta,
+        EventHistory.previous_data
+    ).join(events, events.c.id == EventHistory.event_id)
+    if start is not None:
+        stmt = stmt.where(EventHistory.change_time >= start)
+    if end is not None:
+        stmt = stmt.where(EventHistory.change_time < end)
+    stmt = stmt.order_by(EventHistory.change_time, EventHistory.id)
+    return _export_response(stmt, "event_history", format, compress)
+
+
+def _not_modified(request: Request, response: Response, event: Event) -> Response | None:
+    # Conditional GET on the event's version: a 304 when the client's copy
+    # is current, otherwise the ETag is set on the full response.
+    etag = event_etag(event.id, event.version, event.meta_version)
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
 
 
 @router.get("/{id}", response_model=EventOut)
 def get_event_by_id(
     id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    role = get_user_event_role(current_user, id, db)
+    event, role = resolve_event_access(current_user, id, db)
     if role is None:
-        raise HTTPException(status_code=403, message="Access denied")
+        raise HTTPException(status_code=403, detail="Access denied")
 
-    event = db.query(Event).filter(Event.id == id).first()
-    return event
+    return _not_modified(request, response, event) or event
+
+
+def _conflict(db: Session, user: User, event_id: int) -> HTTPException:
+    # 409 carrying the event as it is now, so the client can merge and retry
+    # with the new ETag
+    forget_event_access(db, event_id)
+    event, _ = resolve_event_access(user, event_id, db)
+    if event is None:
+        return HTTPException(status_code=404, detail="Event not found")
+    etag = event_etag(event.id, event.version, event.meta_version)
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail={
+            "message": "Event was modified by another request",
+            "current": jsonable_encoder(event_dict(event)),
+        },
+        headers={"ETag": etag},
+    )
+
+
+def _check_if_match(request: Request, db: Session, user: User, event: Event):
+    if_match = request.headers.get("If-Match")
+    if if_match and not edit_matches(if_match, event.id, event.version):
+        raise _conflict(db, user, event.id)
+
+
+def _commit_event(db: Session, user: User, event: Event, response: Response):
+    # Event.version is the mapper's version_id_col: the UPDATE only matches
+    # the version that was read, and a concurrent write makes it (and the
+    # history row recorded with it) roll back.
+    event_id = event.id
+    event.version = Event.version + 1
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise _conflict(db, user, event_id)
+    db.refresh(event)
+    response.headers["ETag"] = event_etag(event.id, event.version, event.meta_version)
 
 
 @router.put("/{id}", response_model=EventOut)
 def update_event(
     id: int,
     updates: EventUpdate,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    role = get_user_event_role(current_user, id, db)
+    event, role = resolve_event_access(current_user, id, db)
     if role not in ["owner", "editor"]:
-        raise HTTPException(status_code=403, message="No edit access")
+        raise HTTPException(status_code=403, detail="No edit access")
+    _check_if_match(request, db, current_user, event)
 
-    event = db.query(Event).filter(Event.id == id).first()
-    if not event:
-        raise HTTPException(status_code=404, message="Event not found")
-
-    event_data = {
-        "title": event.title,
-        "description": event.description,
-        "timestamp": event.timestamp.isoformat()
-    }
+    try:
+        values = _update_values(event, updates)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
-    history = EventHistory(
-        event_id=event.id,
-        changed_by=current_user.id,
-        previous_data=json.dumps(event_data)
-    )
-    db.add(history)
-    for field, value in updates.dict(exclude_unset=True).items():
+    record_history(db, [event], current_user.id)
+    for field, value in values.items():
         setattr(event, field, value)
-    db.commit()
-    db.refresh(event)
+    _commit_event(db, current_user, event, response)
     return event
 
 
@@ -120,37 +695,88 @@ def delete_event(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    role = get_user_event_role(current_user, id, db)
+    event, role = resolve_event_access(current_user, id, db)
     if role != "owner":
-        raise HTTPException(status_code=403, message="Only owners can delete")
-
-    event = db.query(Event).filter(Event.id == id).first()
-    if not event:
-        raise HTTPException(status_code=404, message="Event not found")
+        raise HTTPException(status_code=403, detail="Only owners can delete")
 
     db.delete(event)
     db.commit()
+    forget_event_access(db, id)
 
 
 @router.get("/{id}/history")
 def get_event_history(
     id: int,
+    request: Request,
+    response: Response,
+    archived: bool = False,
+    cursor: str | None = None,
+    since: datetime | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    role = get_user_event_role(current_user, id, db)
+    event, role = resolve_event_access(current_user, id, db)
     if role not in ["owner", "editor", "viewer"]:
-        raise HTTPException(status_code=403, message="Access denied")
+        raise HTTPException(status_code=403, detail="Access denied")
 
-    history = db.query(EventHistory).filter(EventHistory.event_id == id).all()
-    return [
+    not_modified = _not_modified(request, response, event)
+    if not_modified:
+        return not_modified
+
+    versions, headers = _history_page(db, event, response, archived, cursor, since, limit)
+    return FastJSONResponse([
         {
             "id": h.id,
             "change_time": h.change_time,
             "changed_by": h.changed_by,
-            "previous_data": json.loads(h.previous_data)
-        } for h in history
-    ]
+            "changes": changes
+        } for h, changes in versions
+    ], headers=headers)
+
+
+def _history_page(db: Session, event: Event, response: Response, archived: bool,
+                  cursor: str | None, since: datetime | None, limit: int):
+    # One keyset page of history, oldest first, with the response headers:
+    # the ETag, X-Last-Cursor with the position of the last version (or the
+    # cursor given, when none follow it) and X-Next-Cursor when more
+    # versions follow. Passing X-Last-Cursor back as ``cursor`` later
+    # returns only versions recorded since. Archived versions come first
+    # when asked for.
+    versions, has_more = load_history_page(
+        db, event, decode_cursor(cursor) if cursor else None, since, limit, archived)
+    headers = {"ETag": response.headers["ETag"]}
+    if versions:
+        last = versions[-1][0]
+        headers["X-Last-Cursor"] = encode_cursor(last.change_time, last.id)
+        if has_more:
+            headers["X-Next-Cursor"] = headers["X-Last-Cursor"]
+    elif cursor:
+        headers["X-Last-Cursor"] = cursor
+    return versions, headers
+
+
+@router.get("/{id}/diff/{version_id}/current")
+def diff_event_version_with_current(
+    id: int,
+    version_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    event, role = resolve_event_access(current_user, id, db)
+    if role not in ["owner", "editor", "viewer"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    loaded = load_version(db, id, version_id)
+    if not loaded:
+        raise HTTPException(status_code=404, detail="Version not found")
+
+    version, data = loaded
+    return {
+        "event_id": id,
+        "diff": diff_fields(data, snapshot_event(event)),
+        "version1_time": version.change_time
+    }
 
 
 @router.get("/{id}/diff/{version1_id}/{version2_id}")
@@ -158,6 +784,7 @@ def diff_event_versions(
     id: int,
     version1_id: int,
     version2_id: int,
+    steps: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -165,61 +792,42 @@ def diff_event_versions(
     if role not in ["owner", "editor", "viewer"]:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    v1 = db.query(EventHistory).filter(EventHistory.id ==
-                                       version1_id, EventHistory.event_id == id).first()
-    v2 = db.query(EventHistory).filter(EventHistory.id ==
-                                       version2_id, EventHistory.event_id == id).first()
+    try:
+        result = diff_versions(db, id, version1_id, version2_id, steps=steps)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
-    if not v1 or not v2:
+    if result is None:
         raise HTTPException(
             status_code=404, detail="One or both versions not found")
-
-    data1 = json.loads(v1.previous_data)
-    data2 = json.loads(v2.previous_data)
-
-    diff = {}
-    for key in set(data1.keys()).union(data2.keys()):
-        val1 = data1.get(key)
-        val2 = data2.get(key)
-        if val1 != val2:
-            diff[key] = {
-                "version1": val1,
-                "version2": val2
-            }
-
-    return {
-        "event_id": id,
-        "diff": diff,
-        "version1_time": v1.change_time,
-        "version2_time": v2.change_time
-    }
+    return result
 
 
 @router.post("/{id}/rollback/{version_id}", response_model=EventOut)
 def rollback_event(
     id: int,
     version_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    role = get_user_event_role(current_user, id, db)
+    event, role = resolve_event_access(current_user, id, db)
     if role != "owner":
         raise HTTPException(status_code=403, detail="Only owners can rollback")
+    _check_if_match(request, db, current_user, event)
 
-    event = db.query(Event).filter(Event.id == id).first()
-    version = db.query(EventHistory).filter(
-        EventHistory.id == version_id, EventHistory.event_id == id).first()
+    loaded = load_version(db, id, version_id)
 
-    if not event or not version:
+    if not loaded:
         raise HTTPException(
             status_code=404, detail="Event or version not found")
 
-    data = json.loads(version.previous_data)
-    for field, value in data.items():
-        setattr(event, field, value)
+    # The rollback itself is recorded, so it can be undone like any edit
+    record_history(db, [event], current_user.id)
+    restore_snapshot(event, loaded[1])
 
-    db.commit()
-    db.refresh(event)
+    _commit_event(db, current_user, event, response)
     return event
 
 
@@ -234,50 +842,55 @@ def get_specific_event_version(
     if role not in ["owner", "editor", "viewer"]:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    version = db.query(EventHistory).filter(
-        EventHistory.id == version_id,
-        EventHistory.event_id == id
-    ).first()
+    loaded = load_version(db, id, version_id)
 
-    if not version:
+    if not loaded:
         raise HTTPException(status_code=404, detail="Version not found")
 
+    version, data = loaded
     return {
         "id": version.id,
         "event_id": version.event_id,
         "change_time": version.change_time,
         "changed_by": version.changed_by,
-        "data": json.loads(version.previous_data)
+        "data": data
     }
 
 
 @router.get("/{id}/changelog")
 def get_event_changelog(
     id: int,
+    request: Request,
+    response: Response,
+    archived: bool = False,
+    cursor: str | None = None,
+    since: datetime | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     # Ensure user has access
-    role = get_user_event_role(current_user, id, db)
+    event, role = resolve_event_access(current_user, id, db)
     if role not in ["owner", "editor", "viewer"]:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    # Fetch history
-    history_entries = db.query(EventHistory).filter(
-        EventHistory.event_id == id
-    ).order_by(EventHistory.change_time.asc()).all()
+    not_modified = _not_modified(request, response, event)
+    if not_modified:
+        return not_modified
+
+    versions, headers = _history_page(db, event, response, archived, cursor, since, limit)
 
     # Build changelog output
     changelog = []
-    for entry in history_entries:
-        data = json.loads(entry.previous_data)
+    for entry, changes in versions:
         changelog.append({
+            "id": entry.id,
             "changed_by": entry.changed_by,
             "change_time": entry.change_time,
-            "changes": data  # This is the old state before update
+            "changes": changes  # What this edit changed, field by field
         })
 
-    return {
+    return FastJSONResponse({
         "event_id": id,
         "changelog": changelog
-    }
+    }, headers=headers)
@@ -0,0 +1,58 @@
+import hmac
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from db import session
+from core import request_metrics
+from core.auth import user_cache_stats
+from core.config import settings
+from core.hash_pool import hash_pool_stats
+from core.metrics import prometheus_text
+
+
+def require_internal_token(x_internal_token: str | None = Header(None)):
+    # Pool, cache and per-route figures describe the deployment, so they
+    # need the operators' shared token rather than a user login (any client
+    # can register with any role)
+    if not settings.INTERNAL_TOKEN or not x_internal_token or not hmac.compare_digest(
+            x_internal_token.encode(), settings.INTERNAL_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid internal token")
+
+
+router = APIRouter(dependencies=[Depends(require_internal_token)])
+
+
+@router.get("/pool")
+def get_pool_metrics():
+    metrics = {"sync": session.pool_metrics.snapshot()}
+    if session.async_pool_metrics is not None:
+        metrics["async"] = session.async_pool_metrics.snapshot()
+    return metrics
+
+
+@router.get("/caches")
+def get_cache_stats():
+    return user_cache_stats()
+
+
+@router.get("/hashing")
+def get_hashing_stats():
+    return hash_pool_stats()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_prometheus_metrics():
+    families = [
+        ("http_request_duration_seconds", "Request latency by route",
+         request_metrics.request_seconds),
+        ("http_requests_total", "Requests by route and status code",
+         request_metrics.requests_total),
+        ("db_statements_per_request", "SQL statements executed per request",
+         request_metrics.request_statements),
+        ("db_request_duration_seconds", "Time spent executing SQL per request",
+         request_metrics.request_db_seconds),
+        ("db_pool_checkout_wait_seconds", "Time waiting for a pooled connection",
+         session.pool_metrics.checkout_wait),
+    ]
+    return PlainTextResponse(
+        "".join(prometheus_text(name, help_text, metric) for name, help_text, metric in families),
+        media_type="text/plain; version=0.0.4")
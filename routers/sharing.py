@@ -1,21 +1,27 @@
+from itertools import islice, product
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import delete, select, update
 from sqlalchemy.orm import Session
-from db.session import SessionLocal
+from db.session import DBRoute, get_db, upsert_insert
 from models.shared_access import SharedAccess
-from schemas.shared_access import ShareRequest
+from schemas.shared_access import BulkRevokeRequest, BulkShareRequest, ShareRequest
 from models.user import User
 from models.event import Event
 from core.auth import get_current_user
 from schemas.user import PermissionUpdate
-router = APIRouter()
+router = APIRouter(route_class=DBRoute)
 
+SHARE_CHUNK_SIZE = 1000
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+
+def _touch_events(db: Session, event_ids: list[int]):
+    # Share changes invalidate the event's ETag through meta_version. The
+    # version is left alone: it is the compare-and-swap column, and bumping
+    # it would make concurrent edits of the event fail with a 409.
+    db.execute(
+        update(Event).where(Event.id.in_(event_ids)).values(meta_version=Event.meta_version + 1)
+        .execution_options(synchronize_session=False)
+    )
 
 
 @router.post("/share")
@@ -28,7 +34,7 @@ def share_event(
 
     if not event or event.created_by != current_user.id:
         raise HTTPException(
-            status_code=403, message="Only owner can share this event")
+            status_code=403, detail="Only owner can share this event")
 
     existing = db.query(SharedAccess).filter(
         SharedAccess.user_id == req.user_id,
@@ -42,10 +48,76 @@ def share_event(
                               event_id=req.event_id, role=req.role)
         db.add(access)
 
+    _touch_events(db, [event.id])
     db.commit()
     return {"message": "Shared successfully"}
 
 
+def _check_owned(db: Session, user: User, event_ids: list[int]):
+    owned = set(db.execute(
+        select(Event.id).where(Event.id.in_(event_ids), Event.created_by == user.id)
+    ).scalars())
+    not_owned = [i for i in event_ids if i not in owned]
+    if not_owned:
+        raise HTTPException(status_code=403, detail={
+            "message": "Only owners can change sharing", "event_ids": not_owned})
+
+
+@router.post("/share/bulk")
+def share_events_bulk(
+    req: BulkShareRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Every event x user pair gets ``role``: one ownership query, then an
+    # upsert on the user_event_unique constraint per chunk of pairs, all in
+    # one transaction.
+    _check_owned(db, current_user, req.event_ids)
+    user_ids = [i for i in req.user_ids if i != current_user.id]
+    known = set(db.execute(select(User.id).where(User.id.in_(user_ids))).scalars())
+    unknown = [i for i in user_ids if i not in known]
+    if unknown:
+        raise HTTPException(status_code=404, detail={
+            "message": "Users not found", "user_ids": unknown})
+
+    stmt = upsert_insert(db, SharedAccess)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SharedAccess.user_id, SharedAccess.event_id],
+        set_={"role": stmt.excluded.role},
+        where=SharedAccess.role != stmt.excluded.role,
+    )
+    changed = 0
+    pairs = product(req.event_ids, user_ids)
+    while chunk := list(islice(pairs, SHARE_CHUNK_SIZE)):
+        changed += db.execute(stmt.values([
+            {"user_id": user_id, "event_id": event_id, "role": req.role.value}
+            for event_id, user_id in chunk
+        ])).rowcount
+
+    _touch_events(db, req.event_ids)
+    db.commit()
+    return {"events": len(req.event_ids), "users": len(user_ids), "changed": changed}
+
+
+@router.post("/share/bulk/revoke")
+def revoke_events_bulk(
+    req: BulkRevokeRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    _check_owned(db, current_user, req.event_ids)
+    revoked = db.execute(
+        delete(SharedAccess).where(
+            SharedAccess.event_id.in_(req.event_ids),
+            SharedAccess.user_id.in_(req.user_ids))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    _touch_events(db, req.event_ids)
+    db.commit()
+    return {"revoked": revoked}
+
+
 @router.get("/{id}/permissions")
 def get_event_permissions(
     id: int,
@@ -95,6 +167,7 @@ def update_permission(
             status_code=404, detail="User does not have access")
 
     access.role = role
+    _touch_events(db, [event.id])
     db.commit()
     return {"message": "Role updated successfully"}
 
@@ -121,5 +194,6 @@ def remove_permission(
             status_code=404, detail="User does not have access")
 
     db.delete(access)
+    _touch_events(db, [event.id])
     db.commit()
     return {"message": "Access removed successfully"}
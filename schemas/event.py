@@ -1,15 +1,59 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, conint, conlist, root_validator, validator
 from datetime import datetime
+from datetime import timedelta
+from enum import Enum
+
+
+class Frequency(str, Enum):
+    daily = "daily"
+    weekly = "weekly"
+    monthly = "monthly"
+    yearly = "yearly"
+
+
+class OccurrenceOverride(BaseModel):
+    occurrence: datetime  # original start of the occurrence being changed
+    title: str | None = None
+    description: str | None = None
+    timestamp: datetime | None = None  # moved start
+
+
+class RecurrenceRule(BaseModel):
+    freq: Frequency
+    interval: conint(ge=1) = 1
+    count: conint(ge=1) | None = None
+    until: datetime | None = None
+    by_weekday: list[conint(ge=0, le=6)] | None = None  # 0 = Monday, weekly only
+    exdates: list[datetime] = []
+    overrides: list[OccurrenceOverride] = []
+
+    @validator("by_weekday")
+    def weekly_only(cls, value, values):
+        if value and values.get("freq") != Frequency.weekly:
+            raise ValueError("by_weekday is only supported for weekly rules")
+        return sorted(set(value)) if value else value
 
 
 class EventBase(BaseModel):
     title: str
     description: str
     timestamp: datetime
+    end_time: datetime | None = None
+    recurrence: RecurrenceRule | None = None
 
 
 class EventCreate(EventBase):
-    pass
+    # Alternative to end_time
+    duration_minutes: conint(ge=0) | None = None
+
+    @root_validator(skip_on_failure=True)
+    def resolve_end_time(cls, values):
+        duration = values.get("duration_minutes")
+        if duration is not None and values.get("end_time") is None:
+            values["end_time"] = values["timestamp"] + timedelta(minutes=duration)
+        if values.get("end_time") is not None and values["end_time"] < values["timestamp"]:
+            raise ValueError("end_time must not be before timestamp")
+        return values
 
 
 class EventBatchCreate(BaseModel):
@@ -20,11 +64,45 @@ class EventUpdate(BaseModel):
     title: str | None = None
     description: str | None = None
     timestamp: datetime | None = None
+    end_time: datetime | None = None
+    duration_minutes: conint(ge=0) | None = None  # applied from the new timestamp
+    recurrence: RecurrenceRule | None = None
+
+
+MAX_BATCH_ITEMS = 5000
+
+
+class EventBatchUpdateItem(EventUpdate):
+    id: int
+    version: int | None = None  # expected version, like If-Match
+
+
+class EventBatchUpdate(BaseModel):
+    events: conlist(EventBatchUpdateItem, min_items=1, max_items=MAX_BATCH_ITEMS)
+
+
+class EventBatchDelete(BaseModel):
+    ids: conlist(int, min_items=1, max_items=MAX_BATCH_ITEMS)
 
 
 class EventOut(EventBase):
     id: int
     created_by: int
+    version: int
 
     class Config:
         orm_mode = True
+
+
+class OccurrenceOut(BaseModel):
+    event_id: int
+    title: str
+    description: str | None
+    timestamp: datetime
+    end_time: datetime | None
+    occurrence: datetime | None  # original start, None for one-off events
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, conlist, root_validator, validator
 from enum import Enum
 
 
@@ -12,3 +12,37 @@ class ShareRequest(BaseModel):
     event_id: int
     user_id: int
     role: Role
+
+
+MAX_BULK_EVENTS = 5000
+MAX_BULK_USERS = 500
+# Event x user pairs per request: bounds the rows written (and locked) in
+# one transaction
+MAX_BULK_PAIRS = 100_000
+
+
+class BulkRevokeRequest(BaseModel):
+    event_ids: conlist(int, min_items=1, max_items=MAX_BULK_EVENTS)
+    user_ids: conlist(int, min_items=1, max_items=MAX_BULK_USERS)
+
+    @validator("event_ids", "user_ids")
+    def deduplicate(cls, value):
+        return list(dict.fromkeys(value))
+
+    @root_validator(skip_on_failure=True)
+    def limit_pairs(cls, values):
+        pairs = len(values["event_ids"]) * len(values["user_ids"])
+        if pairs > MAX_BULK_PAIRS:
+            raise ValueError(f"{pairs} event/user pairs requested, at most {MAX_BULK_PAIRS} are allowed")
+        return values
+
+
+class BulkShareRequest(BulkRevokeRequest):
+    # Every event is shared with every user
+    role: Role
+
+    @validator("role")
+    def not_owner(cls, value):
+        if value == Role.owner:
+            raise ValueError("Events can only be shared as viewer or editor")
+        return value
@@ -16,7 +16,7 @@ class UserOut(BaseModel):
     role: str
 
     class Config:
-        from_attributes = True
+        orm_mode = True
 
 
 class PermissionUpdate(BaseModel):
@@ -0,0 +1,81 @@
+import gzip
+import os
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for the "zstd" codec
+    zstandard = None
+
+EXTENSIONS = {"gzip": ".ndjson.gz", "zstd": ".ndjson.zst"}
+
+
+def _check_codec(codec: str):
+    if codec not in EXTENSIONS:
+        raise ValueError(f"Unknown archive codec {codec!r}")
+    if codec == "zstd" and zstandard is None:
+        raise RuntimeError("The zstd archive codec needs the zstandard package")
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    _check_codec(codec)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    _check_codec(codec)
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class SegmentWriter:
+    # Appends independently compressed members to a segment file. Gzip
+    # members and zstd frames may be concatenated, so a segment is still a
+    # valid .gz/.zst file, and any member decompresses on its own from its
+    # offset. A new segment is started once max_bytes is reached.
+    def __init__(self, directory: str, codec: str, max_bytes: int):
+        _check_codec(codec)
+        self.directory = directory
+        self.codec = codec
+        self.max_bytes = max_bytes
+        self.name = None
+        self._file = None
+        self._sequence = 0
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._sequence += 1
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        self.name = f"{stamp}-{os.getpid()}-{self._sequence}{EXTENSIONS[self.codec]}"
+        self._file = open(os.path.join(self.directory, self.name), "ab")
+
+    def append(self, data: bytes) -> tuple[str, int, int]:
+        # (segment, offset, length) of the compressed member
+        if self._file is None or self._file.tell() >= self.max_bytes:
+            self.close()
+            self._open()
+        member = compress(data, self.codec)
+        offset = self._file.tell()
+        self._file.write(member)
+        return self.name, offset, len(member)
+
+    def sync(self):
+        # Members must be on disk before the rows they hold are deleted
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+
+def read_member(directory: str, segment: str, offset: int, length: int, codec: str) -> bytes:
+    with open(os.path.join(directory, segment), "rb") as f:
+        f.seek(offset)
+        return decompress(f.read(length), codec)
@@ -0,0 +1,87 @@
+import re
+from difflib import SequenceMatcher
+
+
+def field_delta(old: dict, new: dict) -> dict:
+    # Fields of ``new`` that differ from ``old``; removed keys map to None.
+    return {
+        key: new.get(key)
+        for key in old.keys() | new.keys()
+        if old.get(key) != new.get(key)
+    }
+
+
+def apply_delta(base: dict, delta: dict) -> dict:
+    return {**base, **delta}
+
+
+TEXT_FIELDS = {"description"}
+_WORDS = re.compile(r"\s+|\S+")
+
+
+def _word_hunks(old: str, new: str, base: int) -> list[dict]:
+    a, b = _WORDS.findall(old), _WORDS.findall(new)
+    offsets = [base]
+    for token in a:
+        offsets.append(offsets[-1] + len(token))
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    return [
+        _hunk(offsets[i1], "".join(a[i1:i2]), "".join(b[j1:j2]))
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"
+    ]
+
+
+def _hunk(at: int, deleted: str, inserted: str) -> dict:
+    hunk = {"at": at}
+    if deleted:
+        hunk["delete"] = deleted
+    if inserted:
+        hunk["insert"] = inserted
+    return hunk
+
+
+def diff_text(old: str | None, new: str | None) -> list[dict]:
+    # Line-level match first, then word-level inside replaced line blocks.
+    # Each hunk carries its character offset in ``old``; unchanged text is
+    # never repeated.
+    a = (old or "").splitlines(keepends=True)
+    b = (new or "").splitlines(keepends=True)
+    offsets = [0]
+    for line in a:
+        offsets.append(offsets[-1] + len(line))
+
+    hunks = []
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        deleted, inserted = "".join(a[i1:i2]), "".join(b[j1:j2])
+        if tag == "replace":
+            hunks.extend(_word_hunks(deleted, inserted, offsets[i1]))
+        else:
+            hunks.append(_hunk(offsets[i1], deleted, inserted))
+    return hunks
+
+
+def patch_text(old: str | None, hunks: list[dict]) -> str:
+    old = old or ""
+    parts, position = [], 0
+    for hunk in hunks:
+        parts.append(old[position:hunk["at"]])
+        parts.append(hunk.get("insert", ""))
+        position = hunk["at"] + len(hunk.get("delete", ""))
+    parts.append(old[position:])
+    return "".join(parts)
+
+
+def diff_fields(old: dict, new: dict) -> dict:
+    diff = {}
+    for key in sorted(old.keys() | new.keys()):
+        val1, val2 = old.get(key), new.get(key)
+        if val1 == val2:
+            continue
+        if key in TEXT_FIELDS and isinstance(val1, str) and isinstance(val2, str):
+            diff[key] = {"changes": diff_text(val1, val2)}
+        else:
+            diff[key] = {"version1": val1, "version2": val2}
+    return diff
@@ -0,0 +1,33 @@
+def event_etag(event_id: int, version: int, meta_version: int = 0) -> str:
+    # version counts edits of the event, meta_version changes to anything
+    # else its responses depend on (shares, archived history)
+    return f'"{event_id}-{version}.{meta_version}"'
+
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    # If-None-Match compares weakly: a W/ prefix is ignored
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip().removeprefix("W/")
+        if tag == etag:
+            return True
+    return False
+
+
+def edit_matches(header: str | None, event_id: int, version: int) -> bool:
+    # If-Match: strong comparison (a weak tag never matches) of the event
+    # ID and version only, so a write is not refused because the event was
+    # shared or its history archived since the client read it
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith('"') and tag.endswith('"') and \
+                tag[1:-1].partition(".")[0] == f"{event_id}-{version}":
+            return True
+    return False
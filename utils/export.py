@@ -0,0 +1,63 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+EXPORT_BATCH_SIZE = 1000
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _csv_value(value):
+    return json.dumps(value) if isinstance(value, (dict, list)) else _plain(value)
+
+
+def encode_rows(batches, columns: list[str], format: str):
+    # Turns batches of result rows into encoded chunks; only one batch is
+    # held in memory at a time.
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for batch in batches:
+            writer.writerows([_csv_value(v) for v in row] for row in batch)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+        return
+
+    for batch in batches:
+        yield "".join(
+            json.dumps({c: _plain(v) for c, v in zip(columns, row)}) + "\n"
+            for row in batch
+        ).encode()
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_query(session_factory, stmt, format: str, compress: bool = False):
+    # The request's own session is closed before a streamed body is sent,
+    # so the export opens one for the lifetime of the stream and reads it
+    # through a server-side cursor.
+    def generate():
+        db = session_factory()
+        try:
+            result = db.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+            yield from encode_rows(result.partitions(), list(result.keys()), format)
+        finally:
+            db.close()
+
+    return gzip_chunks(generate()) if compress else generate()
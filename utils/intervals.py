@@ -0,0 +1,75 @@
+import heapq
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, literal_column, or_
+
+# Upper bounds of the duration buckets used to index intervals where no
+# range type exists (SQLite). Events longer than the last bound land in a
+# final, unbounded bucket.
+SPAN_BUCKETS = (
+    timedelta(hours=1),
+    timedelta(days=1),
+    timedelta(weeks=1),
+    timedelta(days=31),
+    timedelta(days=366),
+)
+
+
+def span_bucket(start: datetime, end: datetime | None) -> int:
+    duration = (end - start) if end is not None else timedelta(0)
+    for bucket, bound in enumerate(SPAN_BUCKETS):
+        if duration <= bound:
+            return bucket
+    return len(SPAN_BUCKETS)
+
+
+def effective_end(entity):
+    return func.coalesce(entity.end_time, entity.timestamp)
+
+
+def closed_period(entity):
+    # Same expression as the ix_events_period GiST index. The bounds flag is
+    # rendered inline so the planner can match it under server-side binds.
+    return func.tsrange(entity.timestamp, effective_end(entity), literal_column("'[]'"))
+
+
+def overlap_criteria(entity, start: datetime, end: datetime, dialect: str) -> list:
+    # Events overlapping [start, end). An event spans [timestamp, end_time);
+    # one without an end time is a point that overlaps when start <= it < end.
+    exact = [
+        entity.timestamp < end,
+        or_(entity.timestamp >= start, effective_end(entity) > start),
+    ]
+    if dialect == "postgresql":
+        # Matches the GiST index on events; the exact predicate rechecks
+        # the bounds the closed range can't express.
+        return [closed_period(entity).op("&&")(func.tsrange(start, end, "[)")), *exact]
+
+    # Within a bucket the duration is bounded, so the start of an
+    # overlapping event is too: each branch is a plain range scan on
+    # (span_bucket, timestamp).
+    buckets = [
+        and_(entity.span_bucket == bucket, entity.timestamp > start - bound)
+        for bucket, bound in enumerate(SPAN_BUCKETS)
+    ]
+    buckets.append(entity.span_bucket == len(SPAN_BUCKETS))
+    return [or_(*buckets), *exact]
+
+
+def overlapping_pairs(intervals):
+    # Sweep line over (start, end, ...) tuples or rows sorted by start; end
+    # may be None for a point. Yields (earlier, later, overlap_start,
+    # overlap_end) for every overlapping pair, with the intervals as given,
+    # in O(n log n + pairs): only intervals still open at the current start
+    # are kept, in a heap ordered by end. Points overlap intervals
+    # containing them and other points at the same time.
+    active = []
+    for seq, interval in enumerate(intervals):
+        start, end = interval[0], interval[1]
+        end = start if end is None else end
+        # A point ending exactly at ``start`` is still open; sorting points
+        # after intervals with the same end lets the loop stop at it.
+        while active and (active[0][0], active[0][1]) < (start, True):
+            heapq.heappop(active)
+        for other_end, _, _, other in active:
+            yield other, interval, start, min(other_end, end)
+        heapq.heappush(active, (end, end == start, seq, interval))
@@ -0,0 +1,17 @@
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+def _default(value):
+    if isinstance(value, BaseModel):
+        return value.dict()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(ORJSONResponse):
+    # orjson encodes datetimes, enums and plain containers natively, and
+    # writes orjson.Fragment values (JSON already stored as text) verbatim.
+    # Handlers that return one directly also skip jsonable_encoder.
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,114 @@
+import calendar
+import heapq
+from datetime import datetime, timedelta, timezone
+
+ONE_TICK = timedelta(microseconds=1)
+
+
+def to_naive_utc(value: datetime | str | None) -> datetime | None:
+    # Event timestamps are stored naive (UTC); rules and query bounds may be
+    # ISO strings or timezone-aware values.
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    # Clamps to the end of shorter months (Jan 31 -> Feb 28/29)
+    month_index = value.month - 1 + months
+    year, month = value.year + month_index // 12, month_index % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def iter_starts(dtstart: datetime, rule: dict, after: datetime, before: datetime):
+    # Series starts in [after, before), in order. The first candidate is
+    # computed arithmetically, so the cost depends on the window and not on
+    # how many occurrences precede it.
+    until = to_naive_utc(rule.get("until"))
+    if until is not None:
+        before = min(before, until + ONE_TICK)
+    if before <= dtstart:
+        return
+    after = max(after, dtstart)
+    freq, interval, limit = rule["freq"], rule.get("interval") or 1, rule.get("count")
+
+    if freq in ("daily", "weekly") and not rule.get("by_weekday"):
+        step = timedelta(days=interval * (7 if freq == "weekly" else 1))
+        index = -((dtstart - after) // step)  # ceil((after - dtstart) / step)
+        while limit is None or index < limit:
+            start = dtstart + index * step
+            if start >= before:
+                return
+            yield start
+            index += 1
+        return
+
+    if freq == "weekly":
+        days = rule["by_weekday"]
+        period = timedelta(weeks=interval)
+        anchor = dtstart - timedelta(days=dtstart.weekday())
+        first_week = [d for d in days if d >= dtstart.weekday()]
+        week = max(0, (after - anchor) // period)
+        while True:
+            base = anchor + week * period
+            for position, day in enumerate(first_week if week == 0 else days):
+                index = position if week == 0 else len(first_week) + (week - 1) * len(days) + position
+                if limit is not None and index >= limit:
+                    return
+                start = base + timedelta(days=day)
+                if start >= before:
+                    return
+                if start >= after:
+                    yield start
+            week += 1
+
+    months = interval * (12 if freq == "yearly" else 1)
+    elapsed = (after.year - dtstart.year) * 12 + after.month - dtstart.month
+    index = max(0, elapsed // months - 1)
+    while limit is None or index < limit:
+        start = _add_months(dtstart, index * months)
+        if start >= before:
+            return
+        if start >= after:
+            yield start
+        index += 1
+
+
+def _overlaps(start: datetime, duration: timedelta, window_start: datetime, window_end: datetime) -> bool:
+    return start < window_end and (start >= window_start or start + duration > window_start)
+
+
+def expand(dtstart: datetime, rule: dict, window_start: datetime, window_end: datetime,
+           duration: timedelta = timedelta(0)):
+    # Lazily yields (start, original_start, override) for every occurrence
+    # overlapping [window_start, window_end), ordered by start. Excluded
+    # dates are dropped and overrides applied; an override that moves an
+    # occurrence into the window from outside it is picked up as well.
+    exdates = {to_naive_utc(d) for d in rule.get("exdates") or []}
+    overrides = {to_naive_utc(o["occurrence"]): o for o in rule.get("overrides") or []}
+
+    moved = []
+    for original, override in overrides.items():
+        if override.get("timestamp") is None or original in exdates:
+            continue
+        start = to_naive_utc(override["timestamp"])
+        if not _overlaps(start, duration, window_start, window_end):
+            continue
+        if next(iter_starts(dtstart, rule, original, original + ONE_TICK), None) == original:
+            moved.append((start, original, override))
+    moved.sort(key=lambda occurrence: occurrence[0])
+
+    def regular():
+        for start in iter_starts(dtstart, rule, window_start - duration, window_end):
+            if start in exdates:
+                continue
+            override = overrides.get(start)
+            if override is not None and override.get("timestamp") is not None:
+                continue  # served from ``moved`` at its new time
+            if _overlaps(start, duration, window_start, window_end):
+                yield start, start, override
+
+    return heapq.merge(regular(), moved, key=lambda occurrence: occurrence[0])
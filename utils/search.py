@@ -0,0 +1,69 @@
+import re
+from sqlalchemy import column, func, literal_column, select, table
+
+# Words are matched with the english stemmer on Postgres and the porter
+# tokenizer on SQLite, so "meetings" finds "meeting" on both
+MAX_SEARCH_TERMS = 16
+# bm25 column weights on SQLite
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Neither index is mapped: the tsvector column is generated by Postgres and
+# the FTS5 table is filled by triggers (see models/event.py)
+_events = table("events", column("id"), column("search_vector"))
+_events_fts = table("events_fts", column("rowid"))
+
+SEARCH_DDL = {
+    "postgresql": [
+        "ALTER TABLE events ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED",
+        "CREATE INDEX IF NOT EXISTS ix_events_search ON events USING gin (search_vector)",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5("
+        "title, description, content='events', content_rowid='id', tokenize='porter unicode61')",
+        "CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN "
+        "INSERT INTO events_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN "
+        "INSERT INTO events_fts(events_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); END",
+        "CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF title, description ON events BEGIN "
+        "INSERT INTO events_fts(events_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "INSERT INTO events_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    ],
+}
+
+
+def search_terms(query: str) -> list[str]:
+    # Plain words only: operators and quotes in user input are never
+    # passed to the query parser
+    return re.findall(r"\w+", query.lower())[:MAX_SEARCH_TERMS]
+
+
+def match_events(terms: list[str], dialect: str, event_ids):
+    # (id, rank) of the events among ``event_ids`` (a select of ids)
+    # containing every term, as a subquery; a higher rank is a better match
+    # and title hits outweigh description hits. Only those events are
+    # ranked, however many other events match.
+    if dialect == "postgresql":
+        query = func.plainto_tsquery("english", " ".join(terms))
+        # Titles are weighted A and descriptions B in the column
+        stmt = select(
+            _events.c.id.label("id"),
+            func.ts_rank(_events.c.search_vector, query).label("rank")
+        ).where(_events.c.search_vector.op("@@")(query), _events.c.id.in_(event_ids))
+    else:
+        fts = literal_column("events_fts")
+        stmt = select(
+            _events_fts.c.rowid.label("id"),
+            # bm25 is lower for better matches
+            (-func.bm25(fts, TITLE_WEIGHT, DESCRIPTION_WEIGHT)).label("rank")
+        ).where(
+            fts.op("MATCH")(" ".join(f'"{term}"' for term in terms)),
+            # "rowid + 0" keeps the ids a filter on the full-text scan: as a
+            # rowid constraint FTS5 would rerun the query once per id
+            (_events_fts.c.rowid + 0).in_(event_ids)
+        )
+    return stmt.subquery("matches")